@@ -1,50 +1,162 @@
 import argparse
+import os
+import queue
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from common.frame import (
+    TransformSpec,
+    apply_transforms,
+    load_frame_schema,
+    open_records,
+    read_records_into,
+)
+from common.throughput import ThroughputMeter
+
+# 既定のレコードレイアウト（カレントディレクトリによらずこのファイルの隣の setting/ から読む）
+DEFAULT_SCHEMA_PATH = Path(__file__).resolve().parent / "setting" / "frame.yaml"
+# ストリーミング時に使い回すバッファ数（読み込み・変換・書き込みで1つずつ）
+N_STREAM_BUFFERS = 3
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"1 以上の整数で指定してください: {value}")
+    return number
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
-    
+
     parser.add_argument("--input_file", type=str, default="C:\\Users\\takum\\Desktop\\SignalProcessing\\output_16bit_le.bin")
     parser.add_argument("--output_file", type=str, default="C:\\Users\\takum\\Desktop\\SignalProcessing\\output2.bin")
-    
+    parser.add_argument("--schema", type=str, default=str(DEFAULT_SCHEMA_PATH), help="レコードレイアウトの定義ファイル")
+    parser.add_argument("--floor", type=int, default=None, help="指定するとschemaの変換の代わりにdataをこの値以上に書き換える")
+    parser.add_argument("--in_place", action="store_true", help="input_file を直接書き換える")
+    parser.add_argument("--stream", action="store_true", help="チャンク単位で読み書きしてメモリ使用量を一定に保つ")
+    parser.add_argument("--chunk_records", type=positive_int, default=65536, help="ストリーミング時の1チャンクのレコード数")
+
     return parser.parse_args()
 
 
+def get_transforms(args, schema):
+    if args.floor is None:
+        return schema.transforms
+    return (TransformSpec(field="data", type="clamp", params={"min": args.floor}),)
+
+
 def overwrite(args):
-    new_array = []
-    with open(args.input_file, "rb") as file:
-        for _ in range(3):
-            header = file.read(16)
-            
-            binary_data = file.read(100)
-            # 2バイトずつリトルエンディアンで整数を読む
-            data = [int.from_bytes(binary_data[i:i+2], byteorder='little')
-                    for i in range(0, 100, 2)]
-            # 値が5未満のものを5に書き換える
-            data = [max(value, 5) for value in data]
-            
-            footer = file.read(8)
-            
-            new_array.append({
-                "header": header,
-                "data": data,
-                "footer": footer
-            })
-    return new_array
-
-def write_binary_file(args, new_array):
-    with open(args.output_file, 'wb') as file:
-        for data in new_array:
-            file.write(data["header"])
-            for value in data["data"]:
-                file.write(value.to_bytes(2, byteorder='little', signed=False))
-            file.write(data["footer"])
-
-        
+    """レコード数に関係なくファイル全体を一括で書き換える"""
+    schema = load_frame_schema(args.schema)
+    dtype = schema.dtype
+    source = open_records(args.input_file, dtype, mode="r+" if args.in_place else "r")
+    if len(source) == 0:
+        # 空のファイルはメモリマップできないので、空の出力を作るだけにする
+        if not args.in_place:
+            open(args.output_file, "wb").close()
+        return source
+    if args.in_place:
+        records = source
+    else:
+        records = np.memmap(args.output_file, dtype=dtype, mode="w+", shape=source.shape)
+        records[:] = source
+    apply_transforms(records, get_transforms(args, schema))
+    records.flush()
+    return records
+
+
+def _run_thread(target, errors, *args):
+    def run():
+        try:
+            target(*args)
+        except BaseException as error:  # メインスレッドで再送出する
+            errors.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def stream_overwrite(args):
+    """固定長チャンクを読み込み・変換・書き込みの3段でパイプライン処理する
+
+    バッファは N_STREAM_BUFFERS 個を使い回すので、
+    ファイルサイズに関係なくメモリ使用量は一定になる。
+    """
+    if args.chunk_records < 1:
+        raise ValueError(f"chunk_records は 1 以上で指定してください: {args.chunk_records}")
+    schema = load_frame_schema(args.schema)
+    dtype = schema.dtype
+    transforms = get_transforms(args, schema)
+    output_file = args.input_file if args.in_place else args.output_file
+
+    free_buffers = queue.Queue()
+    for _ in range(N_STREAM_BUFFERS):
+        free_buffers.put(np.empty(args.chunk_records, dtype=dtype))
+    read_chunks = queue.Queue()
+    transformed_chunks = queue.Queue()
+    errors = []
+    meter = ThroughputMeter(
+        total_bytes=os.path.getsize(args.input_file), record_size=dtype.itemsize
+    )
+
+    def read(file):
+        try:
+            while True:
+                buffer = free_buffers.get()
+                if buffer is None:
+                    break
+                n_records = read_records_into(file, buffer)
+                if n_records == 0:
+                    break
+                read_chunks.put((buffer, n_records))
+        finally:
+            read_chunks.put(None)
+
+    def write(file):
+        try:
+            while (chunk := transformed_chunks.get()) is not None:
+                buffer, n_records = chunk
+                file.write(buffer[:n_records].view(np.uint8))
+                meter.update(n_records)
+                free_buffers.put(buffer)
+        except BaseException:
+            # 読み込み側と変換側を止める
+            free_buffers.put(None)
+            read_chunks.put(None)
+            raise
+
+    mode = "r+b" if args.in_place else "wb"
+    with open(args.input_file, "rb") as in_file, open(output_file, mode) as out_file:
+        reader = _run_thread(read, errors, in_file)
+        writer = _run_thread(write, errors, out_file)
+        try:
+            while (chunk := read_chunks.get()) is not None:
+                buffer, n_records = chunk
+                apply_transforms(buffer[:n_records], transforms)
+                transformed_chunks.put(chunk)
+                if errors:
+                    break
+        finally:
+            transformed_chunks.put(None)
+            free_buffers.put(None)
+            writer.join()
+            reader.join()
+    if errors:
+        raise errors[0]
+    print(meter.format())
+    return meter
+
+
 def main():
     args = parse_arguments()
-    new_array = overwrite(args)
-    #print(new_array)
-    write_binary_file(args, new_array)
+    if args.stream:
+        stream_overwrite(args)
+    else:
+        overwrite(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from bin import DEFAULT_SCHEMA_PATH, overwrite
+
+MANIFEST_NAME = ".bin_batch_manifest.json"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--input", type=str, required=True, help="入力ディレクトリまたはglobパターン")
+    parser.add_argument("--output_dir", type=str, required=True)
+    parser.add_argument("--schema", type=str, default=str(DEFAULT_SCHEMA_PATH), help="レコードレイアウトの定義ファイル")
+    parser.add_argument("--floor", type=int, default=None, help="指定するとschemaの変換の代わりにdataをこの値以上に書き換える")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="並列プロセス数")
+    parser.add_argument("--hash", action="store_true", help="更新判定にサイズ・更新時刻に加えて内容のハッシュを使う")
+    parser.add_argument("--force", action="store_true", help="更新済みのファイルも変換し直す")
+
+    return parser.parse_args()
+
+
+def find_input_files(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.bin")
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_signature(input_file, schema_digest, floor):
+    """入力ファイルと変換設定が同じなら同じになる識別情報（内容のハッシュは含めない）"""
+    stat = os.stat(input_file)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "schema": schema_digest,
+        "floor": floor,
+    }
+
+
+def manifest_key(input_file):
+    """マニフェストのキー（同じ名前の別のファイルと区別するため絶対パス）"""
+    return str(Path(input_file).resolve())
+
+
+def is_up_to_date(entry, output_file, signature):
+    return (
+        entry is not None
+        and entry["input"] == signature
+        and os.path.isfile(output_file)
+        and os.path.getsize(output_file) == entry["output_size"]
+    )
+
+
+def load_manifest(manifest_path):
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def save_manifest(manifest_path, manifest):
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, manifest_path)
+
+
+def convert_file(input_file, output_file, schema, floor, signature=None, entry=None):
+    """一時ファイルに書き出してから置き換え、途中状態の出力を残さない
+
+    entry（マニフェストの前回の記録）を渡すと、内容のハッシュを signature に加えて比べ、
+    変わっていなければ変換しない。ハッシュは入力を全部読むので、ワーカーの中で計算する。
+
+    Returns:
+        (signature, 書き出したバイト数, 秒数)。変換しなかったときバイト数は None
+    """
+    start = time.perf_counter()
+    if signature is not None:
+        signature = dict(signature, sha256=file_digest(input_file))
+        if is_up_to_date(entry, output_file, signature):
+            return signature, None, time.perf_counter() - start
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        records = overwrite(
+            argparse.Namespace(
+                input_file=input_file,
+                output_file=temp_file,
+                schema=schema,
+                floor=floor,
+                in_place=False,
+            )
+        )
+        n_bytes = records.nbytes
+        del records  # Windowsではマップを閉じないと置き換えられない
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    return signature, n_bytes, time.perf_counter() - start
+
+
+def run_batch(args):
+    input_files = find_input_files(args.input)
+    # 出力先が入力と同じディレクトリだと入力を上書きし、実行のたびに変換が重なる
+    output_dir = Path(args.output_dir).resolve()
+    same_dir = [path for path in input_files if Path(path).resolve().parent == output_dir]
+    if same_dir:
+        raise ValueError(f"output_dir が入力ファイルと同じディレクトリです: {output_dir}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    outputs = {}
+    for input_file in input_files:
+        outputs.setdefault(Path(input_file).name, []).append(input_file)
+    duplicated = [paths for paths in outputs.values() if len(paths) > 1]
+    if duplicated:
+        raise ValueError(f"出力先のファイル名が重なる入力があります: {duplicated}")
+
+    schema_digest = file_digest(args.schema)
+    jobs = {}
+    skipped = 0
+    for input_file in input_files:
+        output_file = os.path.join(args.output_dir, Path(input_file).name)
+        signature = input_signature(input_file, schema_digest, args.floor)
+        entry = None if args.force else manifest.get(manifest_key(input_file))
+        if args.hash:
+            # 内容のハッシュはワーカーで求めて比べる
+            jobs[input_file] = (output_file, signature, entry)
+            continue
+        if is_up_to_date(entry, output_file, signature):
+            skipped += 1
+            continue
+        jobs[input_file] = (output_file, signature, None)
+
+    start = time.perf_counter()
+    total_bytes = 0
+    converted = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                convert_file,
+                input_file,
+                output_file,
+                args.schema,
+                args.floor,
+                signature if args.hash else None,
+                entry,
+            ): input_file
+            for input_file, (output_file, signature, entry) in jobs.items()
+        }
+        for future in as_completed(futures):
+            input_file = futures[future]
+            output_file, signature, _ = jobs[input_file]
+            try:
+                hashed, n_bytes, seconds = future.result()
+            except Exception as error:
+                failed.append(input_file)
+                print(f"NG {input_file}: {error}")
+                continue
+            if n_bytes is None:
+                skipped += 1
+                continue
+            signature = hashed or signature
+            converted += 1
+            total_bytes += n_bytes
+            manifest[manifest_key(input_file)] = {
+                "input": signature,
+                "output_size": os.path.getsize(output_file),
+            }
+            save_manifest(manifest_path, manifest)
+            print(f"OK {input_file} ({n_bytes / 1e6:.1f} MB, {n_bytes / 1e6 / max(seconds, 1e-9):.1f} MB/s)")
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(
+        f"変換 {converted} / スキップ {skipped} / 失敗 {len(failed)}: "
+        f"{total_bytes / 1e6:.1f} MB, {elapsed:.2f} s, {total_bytes / 1e6 / elapsed:.1f} MB/s"
+    )
+    return failed
+
+
+def main():
+    args = parse_arguments()
+    failed = run_batch(args)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""長い波形を間引いて描く折れ線
+
+DecimatedLine は Line2D を1本持ち続け、表示中の x の範囲だけを軸の幅（画素数）程度の
+区間に分け、区間ごとの最小値と最大値をつないだ包絡線を set_data() する。
+ズーム・パンで xlim が変わると間引き直すので、何百万点の波形でも描く点数は画素数に比例し、
+細いピークも消えない。色の変更は set_color() で、軸を clear() して描き直さない。
+x は単調増加を仮定する。
+"""
+import numpy as np
+
+
+def minmax_envelope(x, y, n_bins):
+    """(x, y) を n_bins 区間に分け、区間ごとの最小・最大の点を x の順に並べて返す
+
+    点数が 2 * n_bins 以下ならそのまま返す。両端の点は必ず含める。
+    """
+    n = len(y)
+    if n <= 2 * n_bins:
+        return x, y
+    width = n // n_bins
+    blocks = y[: width * n_bins].reshape(n_bins, width)
+    offsets = np.arange(n_bins) * width
+    first = offsets + np.argmin(blocks, axis=1)
+    second = offsets + np.argmax(blocks, axis=1)
+    # 区間の中で先に来る方を先に置き、折れ線が行き来しないようにする
+    order = np.sort(np.stack([first, second], axis=1), axis=1).reshape(-1)
+    if width * n_bins < n:  # 割り切れない残り
+        tail = width * n_bins + np.array([np.argmin(y[width * n_bins :]), np.argmax(y[width * n_bins :])])
+        order = np.concatenate([order, np.sort(tail)])
+    index = np.concatenate([[0], order, [n - 1]])
+    return x[index], y[index]
+
+
+class DecimatedLine:
+    """ax に1本の折れ線を持ち、表示範囲に合わせて間引いたデータを渡す
+
+    ax.callbacks は登録したメソッドを弱参照で持つので、このオブジェクトは呼び出し側で
+    保持しておくこと。points_per_pixel は1画素あたりの区間数（最小・最大で点数はこの2倍）。
+    """
+
+    def __init__(self, ax, x, y, points_per_pixel=1, **line_kwargs):
+        self.ax = ax
+        self.points_per_pixel = points_per_pixel
+        (self.line,) = ax.plot([], [], **line_kwargs)
+        self.set_data(x, y)
+        ax.callbacks.connect("xlim_changed", self.on_xlim_changed)
+
+    def set_data(self, x, y, autoscale=True):
+        """全体のデータを差し替える（autoscale=True なら表示範囲もデータに合わせる）"""
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        if autoscale:
+            # 全体を間引いた包絡線でも最小・最大と両端は残るので、範囲の計算に使える
+            self.line.set_data(*minmax_envelope(self.x, self.y, self._bins()))
+            self.ax.relim()
+            self.ax.autoscale_view()
+        self.redecimate()
+
+    def set_color(self, color):
+        self.line.set_color(color)
+
+    def _bins(self):
+        return max(1, int(self.ax.bbox.width * self.points_per_pixel))
+
+    def on_xlim_changed(self, ax):
+        self.redecimate()
+
+    def redecimate(self):
+        """今の xlim の範囲（と両隣の1点）だけを間引いて折れ線に渡す"""
+        low, high = sorted(self.ax.get_xlim())
+        start = max(np.searchsorted(self.x, low, side="left") - 1, 0)
+        stop = min(np.searchsorted(self.x, high, side="right") + 1, len(self.x))
+        self.line.set_data(*minmax_envelope(self.x[start:stop], self.y[start:stop], self._bins()))
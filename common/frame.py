@@ -0,0 +1,144 @@
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from common.load_yaml import load_yaml
+
+BYTE_ORDER = {"little": "<", "big": ">"}
+TYPE_KIND = {"uint": "u", "int": "i", "float": "f"}
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    type: str
+    size: int
+    count: int = 1
+    byte_order: str | None = None
+
+
+@dataclass(frozen=True)
+class TransformSpec:
+    field: str
+    type: str
+    params: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class FrameSchema:
+    fields: tuple
+    transforms: tuple
+    byte_order: str = "little"
+
+    @property
+    def dtype(self):
+        return compile_dtype(self.fields, self.byte_order)
+
+
+def compile_dtype(fields, byte_order="little"):
+    """フィールド定義から1レコード分の構造化dtypeを作る"""
+    descr = []
+    for spec in fields:
+        if spec.type == "bytes":
+            base = f"V{spec.size}"
+        else:
+            order = BYTE_ORDER[spec.byte_order or byte_order]
+            base = f"{order}{TYPE_KIND[spec.type]}{spec.size}"
+        if spec.count == 1:
+            descr.append((spec.name, base))
+        else:
+            descr.append((spec.name, base, (spec.count,)))
+    return np.dtype(descr)
+
+
+def load_frame_schema(yaml_file_path="setting/frame.yaml"):
+    yaml_data = load_yaml(yaml_file_path)["frame_schema"]
+    fields = tuple(FieldSpec(**spec) for spec in yaml_data["fields"])
+    transforms = tuple(
+        TransformSpec(
+            field=spec.pop("field"), type=spec.pop("type"), params=spec
+        )
+        for spec in (dict(spec) for spec in yaml_data.get("transforms", []))
+    )
+    for transform in transforms:
+        if transform.type not in TRANSFORMS:
+            raise ValueError(f"未対応の変換です: {transform.type}")
+    return FrameSchema(
+        fields=fields,
+        transforms=transforms,
+        byte_order=yaml_data.get("byte_order", "little"),
+    )
+
+
+def open_records(file_path, dtype, mode="r"):
+    """ファイル全体をレコードの構造化配列としてメモリマップする（空のファイルは空の配列）"""
+    if os.path.getsize(file_path) == 0:
+        return np.empty(0, dtype=dtype)  # 空のファイルはメモリマップできない
+    records = np.memmap(file_path, dtype=np.uint8, mode=mode)
+    if records.size % dtype.itemsize != 0:
+        raise ValueError(
+            f"{file_path} のサイズ({records.size}バイト)が"
+            f"レコード長({dtype.itemsize}バイト)の倍数ではありません。"
+        )
+    return records.view(dtype)
+
+
+def read_records_into(file, buffer):
+    """buffer を埋めるまでレコードを読み込み、読めたレコード数を返す"""
+    raw = memoryview(buffer.view(np.uint8).reshape(-1))
+    filled = 0
+    while filled < len(raw):
+        n_bytes = file.readinto(raw[filled:])
+        if not n_bytes:
+            break
+        filled += n_bytes
+    if filled % buffer.dtype.itemsize != 0:
+        raise ValueError(
+            f"ファイル末尾に不完全なレコードがあります({filled % buffer.dtype.itemsize}バイト)。"
+        )
+    return filled // buffer.dtype.itemsize
+
+
+# -------------------- フィールド単位の変換 --------------------
+
+
+def _store(values, result):
+    """計算結果を元のdtypeに丸めて書き戻す（整数は範囲外を飽和させる）"""
+    if values.dtype.kind in "ui":
+        info = np.iinfo(values.dtype)
+        result = np.clip(np.rint(result), info.min, info.max)
+    values[...] = result
+
+
+def clamp(values, min=None, max=None):
+    np.clip(values, min, max, out=values)
+
+
+def scale(values, factor):
+    _store(values, np.multiply(values, factor, dtype=np.float64))
+
+
+def offset(values, value):
+    _store(values, np.add(values, value, dtype=np.float64))
+
+
+def mask(values, bits):
+    np.bitwise_and(values, values.dtype.type(bits), out=values)
+
+
+TRANSFORMS = {"clamp": clamp, "scale": scale, "offset": offset, "mask": mask}
+
+
+def apply_transforms(records, transforms):
+    """レコード配列のビューに対して変換をその場で順に適用する"""
+    for transform in transforms:
+        TRANSFORMS[transform.type](records[transform.field], **transform.params)
+    return records
+
+
+# test
+if __name__ == "__main__":
+    schema = load_frame_schema()
+    print(schema.dtype, schema.dtype.itemsize)
+    print(schema.transforms)
@@ -1,9 +1,12 @@
 import yaml
 
+# libyaml があれば C 実装のローダーを使う（大きなファイルで数倍速い）
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def load_yaml(yaml_file_path):
     with open(yaml_file_path, "r") as file:
-        yaml_data = yaml.safe_load(file)
+        yaml_data = yaml.load(file, Loader=SafeLoader)
     return yaml_data
 
 
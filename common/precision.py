@@ -0,0 +1,71 @@
+"""処理全体の数値精度の設定 (setting/precision.yaml)
+
+データは real の精度（既定 float32 / complex64）で持ち、桁落ちしやすい累積和だけを
+accumulate の精度（既定 float64）で積算する。
+"""
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from common.load_yaml import load_yaml
+
+# 現在のファイル位置から2階層上のディレクトリ（プロジェクトルート）
+DEFAULT_PRECISION_PATH = Path(__file__).resolve().parent.parent / "setting" / "precision.yaml"
+
+REAL_TYPES = {"float32": np.float32, "float64": np.float64}
+COMPLEX_TYPES = {"float32": np.complex64, "float64": np.complex128}
+
+
+@dataclass(frozen=True)
+class Precision:
+    real: str = "float32"
+    accumulate: str = "float64"
+
+    def __post_init__(self):
+        for name in ("real", "accumulate"):
+            if getattr(self, name) not in REAL_TYPES:
+                raise ValueError(f"precision.{name} は {list(REAL_TYPES)} のどれかで指定してください。")
+
+    @property
+    def real_dtype(self):
+        return np.dtype(REAL_TYPES[self.real])
+
+    @property
+    def complex_dtype(self):
+        return np.dtype(COMPLEX_TYPES[self.real])
+
+    @property
+    def accumulate_dtype(self):
+        return np.dtype(REAL_TYPES[self.accumulate])
+
+
+@functools.lru_cache(maxsize=None)
+def load_precision(yaml_file_path=None):
+    path = Path(yaml_file_path) if yaml_file_path else DEFAULT_PRECISION_PATH
+    if not path.is_file():
+        return Precision()
+    return Precision(**(load_yaml(path) or {}).get("precision", {}))
+
+
+def real_dtype():
+    return load_precision().real_dtype
+
+
+def complex_dtype():
+    return load_precision().complex_dtype
+
+
+def accumulate_dtype():
+    return load_precision().accumulate_dtype
+
+
+def working_dtype(data):
+    """計算に使う実数型（浮動小数点のデータはその精度のまま、整数などは設定の精度）"""
+    dtype = np.asarray(data).dtype
+    if dtype.kind == "f":
+        return dtype
+    if dtype.kind == "c":
+        return np.dtype(dtype.type(0).real.dtype)
+    return real_dtype()
@@ -0,0 +1,263 @@
+"""共有メモリ上のリングバッファ
+
+同じ形・型のNumPy配列のスロットを n_slots 個並べ、プロセス間でコピーせずに受け渡す。
+書き込み側は reserve() で空きスロットのビューを受け取って直接書き込み（ファイルから
+readinto することもできる）、commit() で公開する。読み出し側は get() で
+(通し番号, タグ, 情報, ビュー) を受け取り、使い終わったら release() でスロットを返す。
+
+読み出し側が複数あると、各スロットはどれか1つの読み出し側だけに渡る（処理の分担）。
+書き込み側の数は producers で指定し、全員が close() すると読み出し側の get() は
+残りを読み切ったあとに None を返す。どこかで異常が起きたら abort() で全員を止める。
+
+リングはプロセスの起動時の引数としてだけ渡せる（multiprocessing.Condition と同じ制約）。
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# ヘッダ: 書き込み番号, 読み出し番号, 書き込み中の producer 数, 中断フラグ
+_WRITE, _READ, _PRODUCERS, _ABORTED = range(4)
+_HEADER_FIELDS = 4
+# スロットごとの管理情報: 状態, 通し番号, タグ, 有効な行数, 情報
+_STATE, _SEQUENCE, _TAG, _ROWS, _INFO = range(5)
+_SLOT_FIELDS = 5
+FREE, WRITING, READY, READING = range(4)
+
+# スロットの先頭をキャッシュラインにそろえる
+_ALIGN = 64
+
+
+def _aligned(n_bytes):
+    return -(-n_bytes // _ALIGN) * _ALIGN
+
+
+class SharedRing:
+    def __init__(self, slot_shape, dtype, n_slots=4, producers=1, context=None):
+        self.slot_shape = tuple(slot_shape)
+        self.dtype = np.dtype(dtype)
+        self.n_slots = n_slots
+        if n_slots < 1 or producers < 1:
+            raise ValueError("n_slots と producers は 1 以上で指定してください。")
+        header_bytes = _aligned(8 * (_HEADER_FIELDS + _SLOT_FIELDS * n_slots))
+        slot_bytes = _aligned(int(np.prod(self.slot_shape, dtype=np.int64)) * self.dtype.itemsize)
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=header_bytes + n_slots * max(slot_bytes, _ALIGN)
+        )
+        self._condition = (context or multiprocessing).Condition()
+        self._owner_pid = os.getpid()  # fork した子プロセスでは削除しない
+        self._attach()
+        self._header[:] = 0
+        self._header[_PRODUCERS] = producers
+        # 各スロットの直前の通し番号（最初の周回は負の値）
+        self._slot_info[:, _SEQUENCE] = np.arange(n_slots) - n_slots
+
+    def _attach(self):
+        buffer = self._memory.buf
+        n_header = _HEADER_FIELDS + _SLOT_FIELDS * self.n_slots
+        self._header = np.ndarray((n_header,), dtype=np.int64, buffer=buffer)
+        self._slot_info = self._header[_HEADER_FIELDS:].reshape(self.n_slots, _SLOT_FIELDS)
+        slot_bytes = _aligned(int(np.prod(self.slot_shape, dtype=np.int64)) * self.dtype.itemsize)
+        self._slots = [
+            np.ndarray(
+                self.slot_shape,
+                dtype=self.dtype,
+                buffer=buffer,
+                offset=_aligned(8 * n_header) + i * max(slot_bytes, _ALIGN),
+            )
+            for i in range(self.n_slots)
+        ]
+
+    def __getstate__(self):
+        return {
+            "name": self._memory.name,
+            "slot_shape": self.slot_shape,
+            "dtype": self.dtype.str,
+            "n_slots": self.n_slots,
+            "condition": self._condition,
+        }
+
+    def __setstate__(self, state):
+        self.slot_shape = state["slot_shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.n_slots = state["n_slots"]
+        self._condition = state["condition"]
+        self._memory = shared_memory.SharedMemory(name=state["name"])
+        self._owner_pid = None
+        self._attach()
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def _wait(self, predicate, timeout):
+        """条件を満たすか中断されるまで待つ（self._condition を取った状態で呼ぶ）"""
+        if not self._condition.wait_for(
+            lambda: self._header[_ABORTED] or predicate(), timeout=timeout
+        ):
+            raise TimeoutError("リングバッファの待ち時間が上限を超えました。")
+        return not self._header[_ABORTED]
+
+    # -------------------- 書き込み側 --------------------
+
+    def reserve(self, timeout=None):
+        """次の通し番号と、書き込み先のスロットのビューを返す（中断されていたら None）
+
+        書き込み側が複数あっても、スロットは通し番号の順に使う（1周前の番号が
+        返されるまで待つ）。後の番号が先に空いたスロットを取ると、読み出し側は
+        番号順に読むので、前の番号を待つ書き込み側とともに止まってしまう。
+        """
+        with self._condition:
+            sequence = int(self._header[_WRITE])
+            self._header[_WRITE] += 1
+            info = self._slot_info[sequence % self.n_slots]
+            previous = sequence - self.n_slots
+            if not self._wait(lambda: info[_STATE] == FREE and info[_SEQUENCE] == previous, timeout):
+                return None
+            info[_STATE] = WRITING
+            info[_SEQUENCE] = sequence
+        return sequence, self._slots[sequence % self.n_slots]
+
+    def commit(self, sequence, n_rows=None, tag=-1, info=0):
+        """reserve() したスロットを読み出し側に公開する
+
+        n_rows はスロットの先頭軸のうち有効な行数（0 なら空として読み飛ばされる）。
+        tag と info は読み出し側にそのまま渡る整数。
+        """
+        with self._condition:
+            slot = self._slot_info[sequence % self.n_slots]
+            slot[_ROWS] = self.slot_shape[0] if n_rows is None else n_rows
+            slot[_TAG] = tag
+            slot[_INFO] = info
+            slot[_STATE] = READY
+            self._condition.notify_all()
+
+    def put(self, array, tag=-1, info=0, timeout=None):
+        """array を空きスロットにコピーして公開する（先頭軸はスロットより短くてよい）"""
+        reserved = self.reserve(timeout)
+        if reserved is None:
+            return None
+        sequence, slot = reserved
+        slot[: len(array)] = array
+        self.commit(sequence, len(array), tag, info)
+        return sequence
+
+    def close(self):
+        """この producer の書き込みを終える"""
+        with self._condition:
+            self._header[_PRODUCERS] -= 1
+            self._condition.notify_all()
+
+    # -------------------- 読み出し側 --------------------
+
+    def get(self, timeout=None):
+        """次のスロットを (通し番号, タグ, 情報, ビュー) で返す
+
+        全 producer が close() して読み切った場合と、中断された場合は None を返す。
+        """
+        def ready():
+            # 他の読み出し側が先に取っていくので、毎回その時点の読み出し番号を見る
+            sequence = self._header[_READ]
+            slot = self._slot_info[sequence % self.n_slots]
+            return (slot[_STATE] == READY and slot[_SEQUENCE] == sequence) or (
+                self._header[_PRODUCERS] <= 0 and sequence >= self._header[_WRITE]
+            )
+
+        with self._condition:
+            while True:
+                if not self._wait(ready, timeout):
+                    return None
+                sequence = int(self._header[_READ])
+                slot = self._slot_info[sequence % self.n_slots]
+                if slot[_STATE] != READY or slot[_SEQUENCE] != sequence:
+                    return None  # 書き込み側が全員終わった
+                self._header[_READ] += 1
+                if slot[_ROWS] == 0:
+                    slot[_STATE] = FREE
+                    self._condition.notify_all()
+                    continue
+                slot[_STATE] = READING
+                view = self._slots[sequence % self.n_slots][: slot[_ROWS]]
+                return sequence, int(slot[_TAG]), int(slot[_INFO]), view
+
+    def release(self, sequence):
+        """get() で受け取ったスロットを書き込み側に返す"""
+        with self._condition:
+            self._slot_info[sequence % self.n_slots][_STATE] = FREE
+            self._condition.notify_all()
+
+    # -------------------- 後片付け --------------------
+
+    def abort(self):
+        """待っている全員を起こして止める"""
+        with self._condition:
+            self._header[_ABORTED] = 1
+            self._condition.notify_all()
+
+    @property
+    def aborted(self):
+        return bool(self._header[_ABORTED])
+
+    def destroy(self):
+        """共有メモリを解放する（作ったプロセスでは削除もする）"""
+        self._header = self._slot_info = self._slots = None
+        try:
+            self._memory.close()
+        except BufferError:
+            pass  # get() で渡したビューが残っている（参照がなくなれば解放される）
+        if self._owner_pid == os.getpid():
+            self._memory.unlink()
+
+
+# test
+def _produce(ring, start, stop):
+    for i in range(start, stop):
+        if ring.put(np.full((10, 50), i, dtype=np.float32), tag=i) is None:
+            break
+    ring.close()
+
+
+def _consume(ring, total, count):
+    while (item := ring.get()) is not None:
+        sequence, tag, _, view = item
+        with total.get_lock():
+            total.value += float(view.sum())
+            count.value += 1
+        ring.release(sequence)
+    ring.destroy()
+
+
+def _run(n_producers, n_consumers, n_blocks, n_slots=2, timeout=60.0):
+    """複数の書き込み側・読み出し側で n_blocks 個を受け渡し、(全部届いたか, 秒) を返す"""
+    ring = SharedRing((10, 50), np.float32, n_slots=n_slots, producers=n_producers)
+    total = multiprocessing.Value("d", 0.0)
+    count = multiprocessing.Value("i", 0)
+    bounds = np.linspace(0, n_blocks, n_producers + 1).astype(int)
+    processes = [
+        multiprocessing.Process(target=_consume, args=(ring, total, count)) for _ in range(n_consumers)
+    ] + [
+        multiprocessing.Process(target=_produce, args=(ring, start, stop))
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    deadline = start + timeout
+    for process in processes:
+        process.join(max(deadline - time.perf_counter(), 0.0))
+    hung = any(process.is_alive() for process in processes)
+    if hung:
+        ring.abort()
+        for process in processes:
+            process.join()
+    ring.destroy()
+    expected = 10 * 50 * n_blocks * (n_blocks - 1) / 2
+    return not hung and count.value == n_blocks and total.value == expected, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    for n_producers, n_consumers in ((1, 1), (1, 3), (2, 3), (3, 3), (3, 1)):
+        ok, elapsed = _run(n_producers, n_consumers, n_blocks=3000)
+        print(f"書き込み {n_producers} / 読み出し {n_consumers}: {'OK' if ok else 'NG'} ({elapsed:.2f} s)")
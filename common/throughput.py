@@ -0,0 +1,39 @@
+import time
+
+
+class ThroughputMeter:
+    """処理量を積算し、進捗とスループット(MB/s, records/s)を表示する"""
+
+    def __init__(self, total_bytes=None, record_size=1, interval=1.0, label=""):
+        self.total_bytes = total_bytes
+        self.record_size = record_size
+        self.interval = interval
+        self.label = label
+        self.records = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    @property
+    def bytes(self):
+        return self.records * self.record_size
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def update(self, n_records):
+        self.records += n_records
+        now = time.perf_counter()
+        if self.interval is not None and now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.format())
+
+    def format(self):
+        elapsed = max(self.elapsed, 1e-9)
+        text = (
+            f"{self.label}{self.bytes / 1e6:.1f} MB, {self.records} records, "
+            f"{self.bytes / 1e6 / elapsed:.1f} MB/s, {self.records / elapsed:.0f} records/s"
+        )
+        if self.total_bytes:
+            text = f"{100 * self.bytes / self.total_bytes:5.1f}% " + text
+        return text
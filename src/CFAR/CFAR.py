@@ -1,13 +1,96 @@
 from abc import ABCMeta, abstractmethod
 
-from common.load_yaml import load_yaml
+import numpy as np
+
+from common.precision import working_dtype
+from detection import detection_dtype, group_peaks, make_detections
+from sliding_window import prefix_sum, window_sums
 
 
 class CFAR(metaclass=ABCMeta):
     @abstractmethod
-    def calculate_average():
+    def calculate_average(self, data):
+        """参照セルから雑音の統計量を推定する"""
+        pass
+
+    @abstractmethod
+    def calculate_threshold(self, data):
+        """セルごとの検出閾値（判定できないセルは inf）"""
+        pass
+
+    def window_extent(self, ndim):
+        """ndim 次元の入力で、注目セルの判定に使う前後のセル数 {軸: セル数}"""
+        return {ndim - 1: self.guard_cell + self.reference_cell}
+
+    def wrapped_axes(self, ndim):
+        """参照窓を周期的に折り返す軸"""
+        return set()
+
+    def judgment_threshold(self, after_cfar_data):
+        threshold = self.calculate_threshold(after_cfar_data)
+        return np.where(after_cfar_data <= threshold, 0, 255)
+
+    def threshold_and_noise(self, data):
+        """(検出閾値, 雑音推定値)"""
+        return self.calculate_threshold(data), self.calculate_average(data)
+
+    def detect(self, data, max_chunk_bytes=64 * 1024**2, cluster_gap=None):
+        """閾値を超えたセルだけを疎な構造化配列で返す
+
+        先頭軸が参照窓を持たなければ、その方向に max_chunk_bytes ずつ区切って判定し、
+        全セル分の判定結果を持たない。cluster_gap を指定すると、
+        隣接する検出をまとめて振幅最大の1つだけを残す。
+        """
+        if data.ndim >= 2 and 0 not in self.window_extent(data.ndim):
+            row_bytes = max(data[:1].nbytes, 1)
+            step = max(1, max_chunk_bytes // row_bytes)
+        else:
+            step = max(len(data), 1)
+
+        chunks = [np.empty(0, dtype=detection_dtype(data.ndim))]
+        for start in range(0, len(data), step):
+            chunk = data[start : start + step]
+            threshold, noise = self.threshold_and_noise(chunk)
+            chunks.append(make_detections(chunk, threshold, noise, offset=start))
+        detections = np.concatenate(chunks)
+        if cluster_gap is not None:
+            detections, _ = group_peaks(detections, gap=cluster_gap)
+        return detections
+
+
+class PrefixSumCFAR(CFAR):
+    """参照窓の統計量を累積和の差から求めるCFARの共通部分
+
+    最終軸をレンジ方向として、1レンジラインあたり O(N) で処理する。
+    累積和を取る量 (window_terms) と、窓の合計から閾値を求める処理
+    (threshold_from_sums) を分けているので、ストリーミング処理でも
+    累積和を引き継いで一括処理と同じ結果を出せる。
+    """
+
+    @abstractmethod
+    def window_terms(self, data):
+        """累積和を取る量 (項, ..., range)"""
         pass
 
     @abstractmethod
-    def judgment_threshold(after_cfar_data):
+    def threshold_from_sums(self, lead, lead_count, lag, lag_count):
+        """前側・後側の参照窓の合計とセル数から (検出閾値, 雑音推定値) を求める"""
         pass
+
+    def reference_sums(self, data):
+        """前側・後側の参照窓の合計と、それぞれのセル数"""
+        length = data.shape[-1]
+        return window_sums(
+            prefix_sum(self.window_terms(data)),
+            np.arange(length),
+            self.guard_cell,
+            self.reference_cell,
+            length,
+            dtype=working_dtype(data),
+        )
+
+    def threshold_and_noise(self, data):
+        return self.threshold_from_sums(*self.reference_sums(data))
+
+    def calculate_threshold(self, data):
+        return self.threshold_and_noise(data)[0]
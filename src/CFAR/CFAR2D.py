@@ -0,0 +1,127 @@
+import dataclasses
+
+import numpy as np
+
+from CFAR import CFAR
+from common.precision import accumulate_dtype, working_dtype
+from threshold_factor import ca_factor
+
+
+@dataclasses.dataclass
+class CACFAR2D(CFAR):
+    """レンジ・ドップラーマップ用の2次元CA-CFAR
+
+    注目セルを中心とした (ガード+参照) の矩形からガードの矩形を除いた
+    環状領域の平均を雑音とする。環状領域の合計は積分画像（ドップラー方向、
+    レンジ方向の順に累積和）から各セルO(1)で求める。
+    ドップラー方向は周期的につながっているものとして折り返し、
+    レンジ方向は端で参照セルを切り詰める。
+
+    入力は (doppler, range) または (frames, doppler, range)。
+    フレームは max_chunk_bytes に収まる枚数ずつ処理するので、
+    キューブ全体を渡しても作業領域は一定に収まる。
+    """
+
+    guard_doppler: int
+    guard_range: int
+    reference_doppler: int
+    reference_range: int
+    pfa: float
+    max_chunk_bytes: int = 256 * 1024**2
+
+    def _frames_per_chunk(self, shape):
+        doppler, range_ = shape[-2:]
+        padded = doppler + 2 * (self.guard_doppler + self.reference_doppler) + 1
+        # 積分画像と箱の合計4項ぶん程度の作業領域
+        frame_bytes = 6 * padded * (range_ + 1) * accumulate_dtype().itemsize
+        return max(1, self.max_chunk_bytes // frame_bytes)
+
+    def _chunks(self, data):
+        cube = data.reshape((-1,) + data.shape[-2:])
+        step = self._frames_per_chunk(cube.shape)
+        for start in range(0, cube.shape[0], step):
+            yield slice(start, start + step), cube[start : start + step]
+
+    def _box_sum(self, sat, half_doppler, half_range, outer_doppler):
+        """各セルを中心とした (2*half_doppler+1, 2*half_range+1) の矩形の合計とセル数"""
+        doppler = sat.shape[1] - 2 * outer_doppler - 1
+        range_ = sat.shape[2] - 1
+        top = outer_doppler - half_doppler
+        bottom = top + 2 * half_doppler + 1
+        index = np.arange(range_)
+        left = np.clip(index - half_range, 0, range_)
+        right = np.clip(index + half_range + 1, 0, range_)
+
+        upper = sat[:, top : top + doppler]
+        lower = sat[:, bottom : bottom + doppler]
+        total = lower[..., right] - lower[..., left] - upper[..., right] + upper[..., left]
+        return total, (2 * half_doppler + 1) * (right - left)
+
+    def _annulus(self, frames):
+        """環状領域の合計とセル数（積分画像は accumulate の型で積算し、合計はデータの精度に戻す）"""
+        outer_doppler = self.guard_doppler + self.reference_doppler
+        padded = np.pad(frames, ((0, 0), (outer_doppler, outer_doppler), (0, 0)), mode="wrap")
+        sat = np.zeros(
+            (padded.shape[0], padded.shape[1] + 1, padded.shape[2] + 1), dtype=accumulate_dtype()
+        )
+        np.cumsum(padded, axis=1, dtype=sat.dtype, out=sat[:, 1:, 1:])
+        np.cumsum(sat[:, 1:, 1:], axis=2, out=sat[:, 1:, 1:])
+
+        outer, outer_count = self._box_sum(
+            sat, outer_doppler, self.guard_range + self.reference_range, outer_doppler
+        )
+        inner, inner_count = self._box_sum(
+            sat, self.guard_doppler, self.guard_range, outer_doppler
+        )
+        dtype = working_dtype(frames)
+        return (outer - inner).astype(dtype, copy=False), (outer_count - inner_count).astype(dtype)
+
+    def _factor(self, count, dtype):
+        return ca_factor(count, self.pfa).astype(dtype)
+
+    def window_extent(self, ndim):
+        return {
+            ndim - 2: self.guard_doppler + self.reference_doppler,
+            ndim - 1: self.guard_range + self.reference_range,
+        }
+
+    def wrapped_axes(self, ndim):
+        return {ndim - 2}
+
+    def _chunk_thresholds(self, data):
+        """フレームのチャンクごとに (フレームの範囲, チャンク, 閾値, 雑音推定値)"""
+        for frames, chunk in self._chunks(data):
+            total, count = self._annulus(chunk)
+            noise = total / count
+            yield frames, chunk, self._factor(count, total.dtype) * noise, noise
+
+    def calculate_average(self, data):
+        average = np.empty(data.shape, dtype=working_dtype(data))
+        out = average.reshape((-1,) + data.shape[-2:])
+        for frames, _, _, noise in self._chunk_thresholds(data):
+            out[frames] = noise
+        return average
+
+    def calculate_threshold(self, data):
+        threshold = np.empty(data.shape, dtype=working_dtype(data))
+        out = threshold.reshape((-1,) + data.shape[-2:])
+        for frames, _, chunk_threshold, _ in self._chunk_thresholds(data):
+            out[frames] = chunk_threshold
+        return threshold
+
+    def threshold_and_noise(self, data):
+        threshold = np.empty(data.shape, dtype=working_dtype(data))
+        noise = np.empty_like(threshold)
+        outputs = (threshold.reshape((-1,) + data.shape[-2:]), noise.reshape((-1,) + data.shape[-2:]))
+        for frames, _, chunk_threshold, chunk_noise in self._chunk_thresholds(data):
+            outputs[0][frames] = chunk_threshold
+            outputs[1][frames] = chunk_noise
+        return threshold, noise
+
+    def judgment_threshold(self, after_cfar_data):
+        # キューブ全体の閾値を持たないよう、チャンクごとに判定する
+        result = np.empty(after_cfar_data.shape, dtype=np.uint8)
+        out = result.reshape((-1,) + after_cfar_data.shape[-2:])
+        for frames, chunk, threshold, _ in self._chunk_thresholds(after_cfar_data):
+            out[frames] = np.where(chunk <= threshold, 0, 255)
+        return result
@@ -0,0 +1,69 @@
+import dataclasses
+
+import numpy as np
+
+from CFAR import PrefixSumCFAR
+from threshold_factor import ca_factor, factors_for_counts, threshold_factor
+
+
+@dataclasses.dataclass
+class CellAveragingCFAR(PrefixSumCFAR):
+    """参照窓の平均値を使うCFARの共通部分
+
+    前側・後側の参照窓（ガードセルを除く）の合計を累積和から求めるので、
+    1レンジラインあたり O(N)。最終軸をレンジ方向として、
+    (pulses, range) などの配列をまとめて処理できる。
+    shape を指定すると、その形状パラメータのワイブル雑音で pfa となる係数を使う。
+    """
+
+    guard_cell: int
+    reference_cell: int
+    pfa: float
+    shape: float | None = None
+
+    def window_terms(self, data):
+        return data[np.newaxis]
+
+    def calculate_average(self, data):
+        return self.threshold_and_noise(data)[1]
+
+    def threshold_from_sums(self, lead, lead_count, lag, lag_count):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            noise = self.noise_from_sums(lead[0], lead_count, lag[0], lag_count)
+        factor = np.asarray(self.factor(lead_count + lag_count), dtype=noise.dtype)
+        return np.nan_to_num(factor * noise, nan=np.inf), noise
+
+
+class CACFAR(CellAveragingCFAR):
+    """CA-CFAR: 前後の参照窓全体の平均を雑音とする"""
+
+    def noise_from_sums(self, lead, lead_count, lag, lag_count):
+        return (lead + lag) / (lead_count + lag_count)
+
+    def factor(self, count):
+        # 端のセルは参照セル数が減るので、セル数ごとに係数を求める
+        if self.shape is None:
+            return ca_factor(count, self.pfa)
+        return factors_for_counts(
+            count, lambda n: threshold_factor("ca_cfar", n, self.pfa, shape=self.shape)
+        )
+
+
+class GOCFAR(CellAveragingCFAR):
+    """GO-CFAR: 前後の参照窓の平均の大きい方を雑音とする（クラッタ端で誤警報を抑える）"""
+
+    def noise_from_sums(self, lead, lead_count, lag, lag_count):
+        return np.fmax(lead / lead_count, lag / lag_count)
+
+    def factor(self, count):
+        return threshold_factor("go_cfar", self.reference_cell, self.pfa, shape=self.shape)
+
+
+class SOCFAR(CellAveragingCFAR):
+    """SO-CFAR: 前後の参照窓の平均の小さい方を雑音とする（近接目標の見逃しを抑える）"""
+
+    def noise_from_sums(self, lead, lead_count, lag, lag_count):
+        return np.fmin(lead / lead_count, lag / lag_count)
+
+    def factor(self, count):
+        return threshold_factor("so_cfar", self.reference_cell, self.pfa, shape=self.shape)
@@ -0,0 +1,49 @@
+import dataclasses
+
+import numpy as np
+
+from CFAR import CFAR
+from common.precision import working_dtype
+from sliding_window import sliding_order_statistic
+from threshold_factor import default_rank, threshold_factor
+
+
+@dataclasses.dataclass
+class OSCFAR(CFAR):
+    """OS-CFAR: 前後の参照セルを小さい順に並べて rank 番目の値を雑音とする
+
+    セルごとにソートせず、全セルの参照窓をまとめて np.partition で選択する
+    (sliding_window.sliding_order_statistic)。
+    データの外側は inf とみなすので、参照セルが rank 個に満たない端のセルは判定しない。
+    shape を指定すると、その形状パラメータのワイブル雑音で pfa となる係数を使う。
+    """
+
+    guard_cell: int
+    reference_cell: int
+    pfa: float
+    rank: int | None = None
+    shape: float | None = None
+
+    def __post_init__(self):
+        if self.rank is None:
+            self.rank = default_rank(self.reference_cell)
+        if not 1 <= self.rank <= 2 * self.reference_cell:
+            raise ValueError(f"rank は 1 ～ {2 * self.reference_cell} で指定してください。")
+
+    def calculate_average(self, data):
+        return sliding_order_statistic(
+            np.asarray(data, dtype=working_dtype(data)),
+            self.guard_cell,
+            self.reference_cell,
+            self.rank,
+        )
+
+    def calculate_threshold(self, data):
+        return self.threshold_and_noise(data)[0]
+
+    def threshold_and_noise(self, data):
+        noise = self.calculate_average(data)
+        factor = threshold_factor(
+            "os_cfar", 2 * self.reference_cell, self.pfa, self.rank, self.shape
+        )
+        return factor * noise, noise
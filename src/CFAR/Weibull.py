@@ -1,32 +1,103 @@
 import numpy as np
 import dataclasses
 import matplotlib.pyplot as plt
+from scipy.special import gamma
 
-import CFAR
+from CFAR import PrefixSumCFAR
+from common.precision import working_dtype
+from threshold_factor import factors_for_counts, threshold_factor
+
+EULER_GAMMA = 0.5772156649015329
 
 
 @dataclasses.dataclass
-class WeibullCFAR(CFAR):
+class WeibullCFAR(PrefixSumCFAR):
     """ワイブルCFAR処理
 
+    注目セルの前後の参照セル（ガードセルを除く）から対数モーメントで
+    尺度・形状パラメータを推定し、pfa から閾値を決める。
+    閾値係数は参照セル数ごとに、推定誤差込みで誤警報確率が pfa となるよう解いた値を使う。
+    参照窓の統計量は累積和で更新するので、1レンジラインあたり O(N)。
+    最終軸をレンジ方向として、任意の次元の配列をまとめて処理できる。
+
     Args:
-        CFAR (_type_): _description_
+        CFAR (_type_): CFARの基底クラス
 
     Returns:
-        int: 検出結果 (1:ターゲット, 0:ノイズ)
+        int: 検出結果 (255:ターゲット, 0:ノイズ)
     """
 
-    threshold: float
     guard_cell: int
     reference_cell: int
     pfa: float
 
-    def calculate_average():
-        q
+    def window_terms(self, data):
+        dtype = working_dtype(data)
+        log_data = np.log(np.maximum(data, np.finfo(dtype).tiny, dtype=dtype))
+        return np.stack([log_data, log_data * log_data])
+
+    def log_moments(self, data):
+        """参照窓内の log(x) の平均と分散"""
+        return self.moments_from_sums(*self.reference_sums(data))
+
+    def moments_from_sums(self, lead, lead_count, lag, lag_count):
+        count = lead_count + lag_count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (lead[0] + lag[0]) / count
+            variance = np.maximum((lead[1] + lag[1]) / count - mean * mean, 0.0)
+        # 分散が求まらない端のセルは判定しない
+        mean[..., count < 2] = np.nan
+        return mean, variance
+
+    def factor(self, count):
+        """参照セル数ごとの閾値係数 (log T = mean + factor * std)"""
+        return factors_for_counts(
+            count,
+            lambda n: threshold_factor("weibull_cfar", n, self.pfa) if n >= 2 else np.nan,
+        )
 
-    def judgment_threshold(self, after_cfar_data):
-        return np.where(after_cfar_data <= self.threshold, 0, 255)
+    @staticmethod
+    def parameters(mean, variance):
+        """log(x) の平均・分散から (尺度, 形状) パラメータを求める"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shape = np.pi / np.sqrt(6.0 * variance)
+            scale = np.exp(mean + EULER_GAMMA / shape)
+        return scale, shape
+
+    def threshold_from_moments(self, mean, variance, count):
+        """log T = mean + factor * sqrt(variance)
+
+        参照セルが十分多ければ factor は (γ + log(-log pfa)) * sqrt(6) / π に近づき、
+        P(X > T) = exp(-(T/scale)^shape) = pfa となる閾値と一致する。
+        """
+        factor = np.asarray(self.factor(count), dtype=mean.dtype)
+        threshold = np.exp(mean + factor * np.sqrt(variance))
+        return np.nan_to_num(threshold, nan=np.inf)
+
+    def calculate_average(self, data):
+        """参照窓から推定した (尺度, 形状) パラメータ"""
+        return self.parameters(*self.log_moments(data))
+
+    def threshold_from_sums(self, lead, lead_count, lag, lag_count):
+        # 雑音推定値はワイブル分布の平均 scale * Γ(1 + 1/shape)
+        mean, variance = self.moments_from_sums(lead, lead_count, lag, lag_count)
+        scale, shape = self.parameters(mean, variance)
+        noise = scale * gamma(1.0 + 1.0 / shape)
+        threshold = self.threshold_from_moments(mean, variance, lead_count + lag_count)
+        return threshold, noise
 
 
 if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    clutter = rng.weibull(1.5, size=(4, 1000)) * 2.0
+    clutter[:, [200, 500, 800]] += 20.0
+    cfar = WeibullCFAR(guard_cell=1, reference_cell=16, pfa=1e-3)
+    result = cfar.judgment_threshold(clutter)
+
+    fig = plt.figure()
+    ax = fig.add_subplot(1, 1, 1)
+    ax.plot(clutter[0], label="data")
+    ax.plot(cfar.calculate_threshold(clutter)[0], label="threshold")
+    ax.plot(np.nonzero(result[0])[0], clutter[0, result[0] > 0], "x", label="detection")
+    ax.legend()
     plt.show()
@@ -0,0 +1,203 @@
+"""CFARの誤警報確率・検出確率と処理速度のベンチマーク
+
+設定ファイルのすべてのプロファイルについて、クラッタ（レイリー・ワイブル・K分布）ごとに
+実測の Pfa、SNR ごとの Pd、処理速度 (cells/s)、ピークメモリを求めて JSON に保存する。
+
+    python src/CFAR/benchmark.py --output bench.json
+    python src/CFAR/benchmark.py --compare old.json bench.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from cfar_factory import create_cfar
+from dataclass import load_cfar_config
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--rows", type=int, default=1000, help="1試行のレンジライン数")
+    parser.add_argument("--cells", type=int, default=1000, help="1レンジラインのセル数")
+    parser.add_argument("--trials", type=int, default=4, help="Pfa を求める試行数")
+    parser.add_argument("--snr", type=float, nargs="+", default=[0, 5, 10, 15, 20], help="目標のSNR [dB]")
+    parser.add_argument("--clutter", type=str, nargs="+", default=["rayleigh", "weibull", "k"])
+    parser.add_argument("--weibull_shape", type=float, default=1.5)
+    parser.add_argument("--k_shape", type=float, default=2.0, help="K分布のテクスチャの形状パラメータ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", type=str, nargs=2, default=None, metavar=("OLD", "NEW"), help="2つの結果を比較する")
+
+    return parser.parse_args()
+
+
+# -------------------- クラッタと目標 --------------------
+
+
+def rayleigh_clutter(rng, shape, args):
+    """振幅がレイリー分布のクラッタ（電力は指数分布）"""
+    return rng.exponential(size=shape)
+
+
+def weibull_clutter(rng, shape, args):
+    return rng.weibull(args.weibull_shape, size=shape)
+
+
+def k_clutter(rng, shape, args):
+    """テクスチャ（ガンマ分布）とスペックル（指数分布）の積"""
+    texture = rng.gamma(args.k_shape, 1.0 / args.k_shape, size=shape)
+    return texture * rng.exponential(size=shape)
+
+
+CLUTTER = {"rayleigh": rayleigh_clutter, "weibull": weibull_clutter, "k": k_clutter}
+
+
+def inject_targets(rng, clutter, snr_db, spacing):
+    """参照窓が重ならない間隔 spacing = (行, 列) で目標を入れ、目標セルのマスクを返す
+
+    目標とクラッタは振幅でランダムな位相差で足し合わせる。
+    """
+    data = clutter.copy()
+    targets = np.zeros(clutter.shape, dtype=bool)
+    targets[spacing[0] // 2 :: spacing[0], spacing[1] // 2 :: spacing[1]] = True
+    power = np.mean(clutter) * 10.0 ** (snr_db / 10.0)
+    phase = rng.uniform(0.0, 2.0 * np.pi, size=np.count_nonzero(targets))
+    amplitude = np.sqrt(power) + np.sqrt(clutter[targets]) * np.exp(1j * phase)
+    data[targets] = np.abs(amplitude) ** 2
+    return data, targets
+
+
+# -------------------- 計測 --------------------
+
+
+def measure(cfar, data):
+    """判定結果・処理速度 (cells/s)・ピークメモリ [byte]
+
+    tracemalloc は割り当てごとに遅くなるので、時間を測る実行とメモリを測る実行は分ける。
+    """
+    start = time.perf_counter()
+    result = cfar.judgment_threshold(data) > 0
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    cfar.judgment_threshold(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, data.size / elapsed, peak
+
+
+def run_benchmark(args):
+    cfar_config = load_cfar_config()
+    rng = np.random.default_rng(args.seed)
+    shape = (args.rows, args.cells)
+    results = []
+    for name, profile in cfar_config.profiles.items():
+        cfar = create_cfar(cfar_config, name)
+        extent = cfar.window_extent(2)
+        spacing = tuple(2 * extent[axis] + 1 if axis in extent else 1 for axis in (0, 1))
+        for clutter_name in args.clutter:
+            make_clutter = CLUTTER[clutter_name]
+            false_alarms = 0
+            speeds = []
+            peak = 0
+            for _ in range(args.trials):
+                detected, speed, trial_peak = measure(cfar, make_clutter(rng, shape, args))
+                false_alarms += np.count_nonzero(detected)
+                speeds.append(speed)
+                peak = max(peak, trial_peak)
+
+            pd = {}
+            for snr in args.snr:
+                data, targets = inject_targets(rng, make_clutter(rng, shape, args), snr, spacing)
+                detected = cfar.judgment_threshold(data) > 0
+                pd[str(snr)] = float(np.mean(detected[targets]))
+
+            results.append(
+                {
+                    "cfar": name,
+                    "clutter": clutter_name,
+                    "pfa": profile.detector.pfa,
+                    "measured_pfa": false_alarms / (args.trials * args.rows * args.cells),
+                    "pd": pd,
+                    "cells_per_second": float(np.median(speeds)),
+                    "peak_memory_bytes": peak,
+                }
+            )
+            print(format_result(results[-1]))
+    return {"commit": git_commit(), "arguments": vars(args), "results": results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_result(result):
+    pd = ", ".join(f"{snr}dB:{value:.3f}" for snr, value in result["pd"].items())
+    return (
+        f"{result['cfar']:>12} {result['clutter']:>8}  "
+        f"Pfa {result['measured_pfa']:.2e} (設定 {result['pfa']:.0e})  Pd [{pd}]  "
+        f"{result['cells_per_second'] / 1e6:.1f} Mcells/s  {result['peak_memory_bytes'] / 1e6:.1f} MB"
+    )
+
+
+def compare_results(old, new):
+    """同じ (CFAR, クラッタ) の結果を並べて、変化を表示する"""
+    old_results = {(r["cfar"], r["clutter"]): r for r in old["results"]}
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for result in new["results"]:
+        before = old_results.get((result["cfar"], result["clutter"]))
+        if before is None:
+            print(f"{result['cfar']:>12} {result['clutter']:>8}  (新規)")
+            continue
+        speed = result["cells_per_second"] / before["cells_per_second"]
+        memory = result["peak_memory_bytes"] / max(before["peak_memory_bytes"], 1)
+        # 片方にしかないSNRは比べずに、そのことを表示する
+        common = [snr for snr in result["pd"] if snr in before["pd"]]
+        unmatched = sorted(set(result["pd"]) ^ set(before["pd"]), key=float)
+        pd_change = max((abs(result["pd"][snr] - before["pd"][snr]) for snr in common), default=0.0)
+        print(
+            f"{result['cfar']:>12} {result['clutter']:>8}  "
+            f"Pfa {before['measured_pfa']:.2e} -> {result['measured_pfa']:.2e}  "
+            f"Pd 最大変化 {pd_change:.3f}  速度 x{speed:.2f}  メモリ x{memory:.2f}"
+            + (f"  (片方のみのSNR: {', '.join(unmatched)} dB)" if unmatched else "")
+        )
+
+
+def main():
+    args = parse_arguments()
+    if args.compare:
+        with open(args.compare[0], "r") as file:
+            old = json.load(file)
+        with open(args.compare[1], "r") as file:
+            new = json.load(file)
+        compare_results(old, new)
+        return
+
+    report = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
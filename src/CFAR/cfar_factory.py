@@ -0,0 +1,21 @@
+import dataclasses
+
+from CFAR2D import CACFAR2D
+from CellAveraging import CACFAR, GOCFAR, SOCFAR
+from OrderedStatistic import OSCFAR
+from Weibull import WeibullCFAR
+
+CFAR_TYPES = {
+    "weibull_cfar": WeibullCFAR,
+    "ca_cfar": CACFAR,
+    "go_cfar": GOCFAR,
+    "so_cfar": SOCFAR,
+    "os_cfar": OSCFAR,
+    "ca_cfar_2d": CACFAR2D,
+}
+
+
+def create_cfar(cfar_config, profile=None):
+    """設定ファイルで選択されたプロファイルのCFARを作る（profile を渡すとそちらを使う）"""
+    profile = cfar_config.profiles[profile or cfar_config.profile]
+    return CFAR_TYPES[profile.cfar_type](**dataclasses.asdict(profile.detector))
@@ -1,7 +1,26 @@
+import dataclasses
+import os
+import threading
+import time
+import typing
 from dataclasses import dataclass
+from pathlib import Path
 
 from common.load_yaml import load_yaml
 
+# 現在のファイル位置から3階層上のディレクトリ（プロジェクトルート）
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CONFIG_PATH = PROJECT_ROOT / "setting" / "CFAR.yaml"
+
+
+def _check_window(config, *names):
+    for name in names:
+        minimum = 1 if name.startswith("reference") else 0
+        if getattr(config, name) < minimum:
+            raise ValueError(f"{name} は {minimum} 以上で指定してください。")
+    if not 0.0 < config.pfa < 1.0:
+        raise ValueError("pfa は 0 より大きく 1 より小さい値で指定してください。")
+
 
 @dataclass(frozen=True)
 class WeibullConfig:
@@ -9,13 +28,221 @@ class WeibullConfig:
     reference_cell: int
     pfa: float
 
+    def __post_init__(self):
+        _check_window(self, "guard_cell", "reference_cell")
+        # 端で片側の窓だけになっても log(x) の分散を求められるよう、2セル以上にする
+        if self.reference_cell < 2:
+            raise ValueError("reference_cell は 2 以上で指定してください。")
+
+
+# CA / GO / SO-CFAR 共通
+@dataclass(frozen=True)
+class CellAveragingConfig:
+    guard_cell: int
+    reference_cell: int
+    pfa: float
+    shape: float | None = None  # ワイブル雑音の形状パラメータ（省略時は指数分布）
+
+    def __post_init__(self):
+        _check_window(self, "guard_cell", "reference_cell")
+
+
+@dataclass(frozen=True)
+class OSConfig:
+    guard_cell: int
+    reference_cell: int
+    pfa: float
+    rank: int | None = None
+    shape: float | None = None
+
+    def __post_init__(self):
+        _check_window(self, "guard_cell", "reference_cell")
+        if self.rank is not None and not 1 <= self.rank <= 2 * self.reference_cell:
+            raise ValueError(f"rank は 1 ～ {2 * self.reference_cell} で指定してください。")
+
+
+@dataclass(frozen=True)
+class CFAR2DConfig:
+    guard_doppler: int
+    guard_range: int
+    reference_doppler: int
+    reference_range: int
+    pfa: float
+
+    def __post_init__(self):
+        _check_window(
+            self, "guard_doppler", "guard_range", "reference_doppler", "reference_range"
+        )
+
+
+CONFIG_TYPES = {
+    "weibull_cfar": WeibullConfig,
+    "ca_cfar": CellAveragingConfig,
+    "go_cfar": CellAveragingConfig,
+    "so_cfar": CellAveragingConfig,
+    "os_cfar": OSConfig,
+    "ca_cfar_2d": CFAR2DConfig,
+}
+
+
+@dataclass(frozen=True)
+class DetectorProfile:
+    """名前付きの検出器設定（CFARの種類とそのパラメータ）"""
+
+    name: str
+    cfar_type: str
+    detector: typing.Any
+
 
 # 他のCFARへの拡張を見越してここを分けた。
 @dataclass(frozen=True)
 class CFARConfig:
-    cfar_config: WeibullConfig
+    profile: str  # 既定で使うプロファイル名
+    profiles: dict
+
+    @property
+    def selected(self):
+        return self.profiles[self.profile]
+
+
+def _accepts(annotation, value):
+    """YAMLの値が型注釈に合うか（int を float として受け付け、bool は数値としない）"""
+    options = typing.get_args(annotation) or (annotation,)
+    if isinstance(value, bool):
+        return False
+    if value is None:
+        return type(None) in options
+    if isinstance(value, int) and float in options:
+        return True
+    return any(isinstance(value, option) for option in options if option is not type(None))
+
+
+def _build(config_type, params, where):
+    """dict を型を確認しながら frozen dataclass にする"""
+    if not isinstance(params, dict):
+        raise ValueError(f"{where}: 設定は key: value の形式で書いてください。")
+    hints = typing.get_type_hints(config_type)
+    fields = {field.name: field for field in dataclasses.fields(config_type)}
+    unknown = set(params) - set(fields)
+    if unknown:
+        raise ValueError(f"{where}: 不明な項目 {sorted(unknown)} (使える項目: {list(fields)})")
+    missing = [
+        name
+        for name, field in fields.items()
+        if name not in params
+        and field.default is dataclasses.MISSING
+        and field.default_factory is dataclasses.MISSING
+    ]
+    if missing:
+        raise ValueError(f"{where}: 必須の項目 {missing} がありません。")
+    for name, value in params.items():
+        if not _accepts(hints[name], value):
+            raise ValueError(f"{where}.{name}: {value!r} は {hints[name]} ではありません。")
+    try:
+        values = {
+            name: float(value) if hints[name] is float else value
+            for name, value in params.items()
+        }
+        return config_type(**values)
+    except ValueError as error:
+        raise ValueError(f"{where}: {error}") from None
+
+
+def parse_cfar_config(yaml_data):
+    """YAMLの内容を検証して CFARConfig にする"""
+    cfar_data = yaml_data.get("cfar_config") if isinstance(yaml_data, dict) else None
+    if not isinstance(cfar_data, dict) or not isinstance(cfar_data.get("profiles"), dict):
+        raise ValueError("cfar_config.profiles がありません。")
+
+    profiles = {}
+    for name, params in cfar_data["profiles"].items():
+        where = f"cfar_config.profiles.{name}"
+        if not isinstance(params, dict):
+            raise ValueError(f"{where}: 設定は key: value の形式で書いてください。")
+        params = dict(params)
+        cfar_type = params.pop("cfar_type", None)
+        if cfar_type not in CONFIG_TYPES:
+            raise ValueError(f"{where}.cfar_type: {cfar_type!r} (使えるCFAR: {list(CONFIG_TYPES)})")
+        profiles[name] = DetectorProfile(
+            name=name, cfar_type=cfar_type, detector=_build(CONFIG_TYPES[cfar_type], params, where)
+        )
+
+    profile = cfar_data.get("profile")
+    if profile not in profiles:
+        raise ValueError(f"cfar_config.profile: {profile!r} (プロファイル: {list(profiles)})")
+    return CFARConfig(profile=profile, profiles=profiles)
+
+
+def resolve_config_path(yaml_file_path=None):
+    """相対パスはカレントディレクトリではなくプロジェクトルートから探す"""
+    path = Path(yaml_file_path) if yaml_file_path else DEFAULT_CONFIG_PATH
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+# パス -> (更新時刻, 設定)
+_config_cache = {}
+_config_lock = threading.Lock()
+
+
+def load_cfar_config(yaml_file_path=None):
+    """設定を読み込む。ファイルの更新時刻が変わっていなければ前回の結果を返す"""
+    path = resolve_config_path(yaml_file_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _config_lock:
+        cached = _config_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    config = parse_cfar_config(load_yaml(path))
+    with _config_lock:
+        _config_cache[path] = (mtime, config)
+    return config
+
+
+class CFARConfigWatcher:
+    """長時間動かす処理向けに、設定ファイルが変わったら読み直す
+
+    config を参照するたびに（interval 秒に1回まで）更新時刻を確認する。
+    start() でバックグラウンドスレッドから監視し、変更時に callback(config) を呼ぶこともできる。
+    書きかけなどで読み込みに失敗した場合は、直前の設定を使い続ける。
+    """
+
+    def __init__(self, yaml_file_path=None, interval=1.0):
+        self.path = resolve_config_path(yaml_file_path)
+        self.interval = interval
+        self._config = load_cfar_config(self.path)
+        self._checked = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def config(self):
+        if time.monotonic() - self._checked >= self.interval:
+            self.reload()
+        return self._config
+
+    def reload(self):
+        """設定が変わっていれば読み直し、変わったかどうかを返す"""
+        self._checked = time.monotonic()
+        try:
+            config = load_cfar_config(self.path)
+        except Exception as error:  # 監視を止めないよう、何が起きても直前の設定を使い続ける
+            print(f"設定の再読み込みに失敗しました: {error!r}")
+            return False
+        changed = config is not self._config
+        self._config = config
+        return changed
+
+    def start(self, callback):
+        def watch():
+            while not self._stop.wait(self.interval):
+                if self.reload():
+                    callback(self._config)
 
+        self._stop.clear()
+        self._thread = threading.Thread(target=watch, daemon=True)
+        self._thread.start()
 
-def load_cfar_config():
-    yaml_data = load_yaml("setting/CFAR.yaml")
-    return CFARConfig(**yaml_data)
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,100 @@
+"""疎な検出結果
+
+検出セルだけを (セル番号, 振幅, 閾値, SNR) の構造化配列で持つ。
+全セル分の 0/255 配列を作らないので、大きなキューブでも検出数に比例したメモリで済む。
+"""
+import itertools
+
+import numpy as np
+
+
+def detection_dtype(ndim):
+    return np.dtype(
+        [
+            ("index", np.int32, (ndim,)),
+            ("amplitude", np.float32),
+            ("threshold", np.float32),
+            ("snr", np.float32),  # 雑音推定値に対する振幅 [dB]
+        ]
+    )
+
+
+def make_detections(data, threshold, noise, offset=0):
+    """閾値を超えたセルを構造化配列にまとめる（offset は先頭軸の開始位置）"""
+    hits = np.nonzero(data > threshold)
+    detections = np.empty(len(hits[0]), dtype=detection_dtype(data.ndim))
+    index = np.stack(hits, axis=-1)
+    index[:, 0] += offset
+    detections["index"] = index
+    detections["amplitude"] = data[hits]
+    detections["threshold"] = threshold[hits]
+    with np.errstate(divide="ignore"):
+        detections["snr"] = 10.0 * np.log10(data[hits] / noise[hits])
+    return detections
+
+
+def to_dense(detections, shape):
+    """従来の 0/255 配列に戻す"""
+    result = np.zeros(shape, dtype=np.uint8)
+    result[tuple(detections["index"].T)] = 255
+    return result
+
+
+def cluster_labels(detections, gap=1, axes=None):
+    """axes 方向に gap セル以内で隣り合う検出を同じクラスタとしてラベルを付ける
+
+    疎な検出同士の隣接関係を二分探索で求め、最小ラベルの伝搬でまとめるので、
+    密な配列は作らない。axes を省略すると末尾2軸（フレームをまたがない）。
+    """
+    if gap < 1:
+        raise ValueError(f"gap は1以上にしてください: {gap}")
+    index = detections["index"].astype(np.int64)
+    n, ndim = index.shape
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    axes = [axis % ndim for axis in (axes if axes is not None else range(-min(ndim, 2), 0))]
+
+    shape = index.max(axis=0) + 1
+    linear = np.ravel_multi_index(index.T, shape)
+    order = np.argsort(linear)
+    sorted_linear = linear[order]
+
+    first, second = [], []
+    for step in itertools.product(range(-gap, gap + 1), repeat=len(axes)):
+        # 隣接は対称なので片側だけ調べる
+        if step <= (0,) * len(axes):
+            continue
+        offset = np.zeros(ndim, dtype=np.int64)
+        offset[axes] = step
+        neighbour = index + offset
+        valid = np.all((neighbour >= 0) & (neighbour < shape), axis=1)
+        target = np.ravel_multi_index(neighbour[valid].T, shape)
+        position = np.minimum(np.searchsorted(sorted_linear, target), n - 1)
+        found = sorted_linear[position] == target
+        first.append(np.nonzero(valid)[0][found])
+        second.append(order[position[found]])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, first, labels[second])
+        np.minimum.at(labels, second, labels[first])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def group_peaks(detections, gap=1, axes=None):
+    """クラスタごとに振幅が最大の検出だけを残す
+
+    Returns:
+        (代表の検出, 各クラスタのセル数)
+    """
+    labels = cluster_labels(detections, gap, axes)
+    order = np.lexsort((-detections["amplitude"], labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    sizes = np.diff(np.append(np.nonzero(first)[0], len(order)))
+    return detections[order[first]], sizes
@@ -1,14 +1,24 @@
 import sys
 from pathlib import Path
 
+import numpy as np
+
 # 現在のファイル位置から3階層上のディレクトリを取得
 project_root = Path(__file__).resolve().parent.parent.parent
 
 # sys.path にプロジェクトのルートディレクトリを追加
 sys.path.append(str(project_root))
 
+from common.precision import real_dtype
 from dataclass import load_cfar_config
+from cfar_factory import create_cfar
 
 if __name__ == "__main__":
     cfar_config = load_cfar_config()
     print(cfar_config)
+
+    cfar = create_cfar(cfar_config)
+    rng = np.random.default_rng(0)
+    data = rng.exponential(size=(500, 5000)).astype(real_dtype())
+    result = cfar.judgment_threshold(data)
+    print(type(cfar).__name__, np.count_nonzero(result) / result.size)
@@ -0,0 +1,82 @@
+"""単精度 (float32) と倍精度 (float64) でのCFARの結果のずれを確かめる
+
+設定ファイルのすべてのプロファイルについて、同じクラッタ＋目標のデータを float64 と
+float32 で処理し、しきい値の最大相対誤差と、判定が食い違ったセルの数を表示する。
+食い違いの割合が --tolerance を超えたら終了コード 1 を返す。
+
+    python src/CFAR/precision_drift.py
+    python src/CFAR/precision_drift.py --clutter weibull k --snr 10
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from benchmark import CLUTTER, inject_targets
+from cfar_factory import create_cfar
+from dataclass import load_cfar_config
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--rows", type=int, default=500, help="レンジライン数")
+    parser.add_argument("--cells", type=int, default=5000, help="1レンジラインのセル数")
+    parser.add_argument("--snr", type=float, default=13.0, help="目標のSNR [dB]")
+    parser.add_argument("--clutter", type=str, nargs="+", default=["rayleigh", "weibull", "k"])
+    parser.add_argument("--weibull_shape", type=float, default=1.5)
+    parser.add_argument("--k_shape", type=float, default=2.0, help="K分布のテクスチャの形状パラメータ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="許容する判定の食い違いの割合")
+
+    return parser.parse_args()
+
+
+def drift(cfar, data):
+    """(しきい値の最大相対誤差, 判定が食い違ったセル数, 倍精度での検出数)"""
+    reference = cfar.calculate_threshold(data.astype(np.float64))
+    single = cfar.calculate_threshold(data.astype(np.float32))
+    if single.dtype != np.float32:
+        raise ValueError(f"単精度の入力に対して {single.dtype} のしきい値が返りました。")
+    valid = np.isfinite(reference) & (reference > 0)
+    error = np.abs(single[valid] - reference[valid]) / reference[valid]
+    detected = data > reference
+    differing = np.count_nonzero(detected != (data.astype(np.float32) > single))
+    return float(np.max(error, initial=0.0)), differing, int(np.count_nonzero(detected))
+
+
+def main():
+    args = parse_arguments()
+    cfar_config = load_cfar_config()
+    rng = np.random.default_rng(args.seed)
+    shape = (args.rows, args.cells)
+    worst = 0.0
+    for name in cfar_config.profiles:
+        cfar = create_cfar(cfar_config, name)
+        extent = cfar.window_extent(2)
+        spacing = tuple(2 * extent[axis] + 1 if axis in extent else 1 for axis in (0, 1))
+        for clutter_name in args.clutter:
+            clutter = CLUTTER[clutter_name](rng, shape, args)
+            data, _ = inject_targets(rng, clutter, args.snr, spacing)
+            # 両方の精度で同じ値から始めるため、先に単精度で表せる値にそろえる
+            data = data.astype(np.float32).astype(np.float64)
+            error, differing, detections = drift(cfar, data)
+            worst = max(worst, differing / data.size)
+            print(
+                f"{name:>12} {clutter_name:>8}  しきい値の相対誤差 {error:.1e}  "
+                f"食い違い {differing} / {data.size} セル（倍精度の検出 {detections}）"
+            )
+    if worst > args.tolerance:
+        print(f"食い違いの割合 {worst:.1e} が許容値 {args.tolerance:.0e} を超えました。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+
+from common.precision import accumulate_dtype
+
+
+def prefix_sum(values):
+    """最終軸方向の累積和（先頭に0を付け、精度設定の accumulate の型（既定 float64）で積算する）"""
+    dtype = accumulate_dtype()
+    prefix = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,), dtype=dtype)
+    np.cumsum(values, axis=-1, dtype=dtype, out=prefix[..., 1:])
+    return prefix
+
+
+def window_bounds(index, guard_cell, reference_cell, length):
+    """注目セルの前側・後側の参照窓の範囲 [lo, hi) を返す（端ではデータ内に切り詰める）"""
+    lead_lo = np.clip(index - guard_cell - reference_cell, 0, length)
+    lead_hi = np.clip(index - guard_cell, 0, length)
+    lag_lo = np.clip(index + guard_cell + 1, 0, length)
+    lag_hi = np.clip(index + guard_cell + reference_cell + 1, 0, length)
+    return lead_lo, lead_hi, lag_lo, lag_hi
+
+
+def window_sums(prefix, index, guard_cell, reference_cell, length, offset=0, dtype=None):
+    """累積和から前側・後側の参照窓の合計とセル数をO(1)/セルで求める
+
+    Args:
+        prefix: prefix_sum の結果。prefix[..., k - offset] が先頭 k セルの合計。
+        index: 注目セルの番号
+        length: データの全長（窓をこの範囲に切り詰める）
+        offset: prefix の先頭に対応するセル番号
+        dtype: 差を取ったあとの合計とセル数の型（データの精度に戻し、以降の計算をその精度で行う）
+    """
+    lead_lo, lead_hi, lag_lo, lag_hi = window_bounds(
+        index, guard_cell, reference_cell, length
+    )
+    lead = prefix[..., lead_hi - offset] - prefix[..., lead_lo - offset]
+    lag = prefix[..., lag_hi - offset] - prefix[..., lag_lo - offset]
+    lead_count = lead_hi - lead_lo
+    lag_count = lag_hi - lag_lo
+    if dtype is not None:
+        lead, lead_count, lag, lag_count = (
+            values.astype(dtype, copy=False) for values in (lead, lead_count, lag, lag_count)
+        )
+    return lead, lead_count, lag, lag_count
+
+
+def sliding_order_statistic(values, guard_cell, reference_cell, rank, max_chunk_bytes=64 * 1024**2):
+    """最終軸方向に、前後の参照窓を合わせて小さい方から rank 番目の値を求める
+
+    各セルの参照セル 2×reference_cell 個を (行, レンジ, 参照セル) に並べ、np.partition
+    （選択アルゴリズム、平均 O(reference_cell)）で rank 番目を全セルまとめて求める。
+    並べた配列が max_chunk_bytes 程度になるよう、行とレンジ方向に分けて処理する。
+    データの外側は inf とみなす。
+    """
+    shape = values.shape
+    length = shape[-1]
+    lines = values.reshape(int(np.prod(shape[:-1])), length)
+    pad = guard_cell + reference_cell
+    padded = np.full((len(lines), length + 2 * pad), np.inf, dtype=values.dtype)
+    padded[:, pad : pad + length] = lines
+    # 注目セルから見た参照セルの位置（padded 上で、注目セルの窓の先頭からの距離）
+    offsets = np.concatenate([np.arange(reference_cell), np.arange(pad + guard_cell + 1, 2 * pad + 1)])
+    result = np.empty(lines.shape, dtype=values.dtype)
+    cells = max(1, max_chunk_bytes // (len(offsets) * values.dtype.itemsize))
+    rows = max(1, min(len(lines), cells // max(length, 1)))
+    step = max(1, cells // rows)
+    for row in range(0, len(lines), rows):
+        for start in range(0, length, step):
+            index = np.arange(start, min(start + step, length))[:, np.newaxis] + offsets
+            window = padded[row : row + rows, index]
+            result[row : row + rows, start : start + len(index)] = np.partition(window, rank - 1, axis=-1)[
+                ..., rank - 1
+            ]
+    return result.reshape(shape)
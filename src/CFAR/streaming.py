@@ -0,0 +1,110 @@
+import numpy as np
+
+from CFAR import PrefixSumCFAR
+from common.precision import accumulate_dtype, working_dtype
+from detection import detection_dtype, make_detections
+from sliding_window import window_sums
+
+
+class StreamingCFAR:
+    """レンジ方向（最終軸）に少しずつ届くデータを逐次CFAR判定する
+
+    push() で (..., m) のブロックを渡すと、後側の参照窓がそろったセルの検出を返す。
+    判定の遅延は常に latency (= ガード+参照) セルで、保持するのは
+    まだ判定していないセルと、その前側の参照窓に必要な分だけ。
+    flush() でラインの終わりを伝えると残りのセルを判定し、次のラインに備える。
+
+    累積和を使うCFARは累積和の末尾を引き継いで計算するので、
+    検出結果はライン全体を一括で detect() した場合とビット単位で一致する。
+    """
+
+    def __init__(self, cfar):
+        if set(cfar.window_extent(2)) != {1}:
+            raise ValueError("レンジ方向の1次元CFARのみ逐次処理できます。")
+        self.cfar = cfar
+        self.latency = cfar.guard_cell + cfar.reference_cell
+        self.reset()
+
+    def reset(self):
+        self.received = 0  # 受け取ったセル数
+        self.next_cell = 0  # 次に判定するセル
+        self.history_start = 0  # history[..., 0] のセル番号
+        self.history = None  # 未判定のセルと、その前側の参照窓に必要なデータ
+        self.prefix = None  # history_start からの累積和（PrefixSumCFARのみ）
+
+    def push(self, block):
+        block = np.asarray(block)
+        if self.history is None:
+            self.history = block[..., :0]
+            if isinstance(self.cfar, PrefixSumCFAR):
+                terms = self.cfar.window_terms(block[..., :0])
+                self.prefix = np.zeros(terms.shape[:-1] + (1,), dtype=accumulate_dtype())
+        self.history = np.concatenate([self.history, block], axis=-1)
+        if self.prefix is not None:
+            terms = self.cfar.window_terms(block)
+            carried = np.concatenate([self.prefix[..., -1:], terms], axis=-1)
+            self.prefix = np.concatenate(
+                [self.prefix, np.cumsum(carried, axis=-1, dtype=self.prefix.dtype)[..., 1:]], axis=-1
+            )
+        self.received += block.shape[-1]
+        return self._judge(self.received - self.latency)
+
+    def flush(self):
+        """ラインの終わりまで判定して状態を初期化する"""
+        if self.history is None:
+            return np.empty(0, dtype=detection_dtype(1))
+        detections = self._judge(self.received)
+        self.reset()
+        return detections
+
+    def push_records(self, records, field="data"):
+        """common.frame で読んだレコードの field を、レコード順につないで渡す"""
+        values = records[field]
+        return self.push(values.reshape(-1))
+
+    def _judge(self, stop):
+        start = self.next_cell
+        stop = max(stop, start)
+        cells = np.arange(start, stop)
+        local = slice(start - self.history_start, stop - self.history_start)
+        data = self.history[..., local]
+
+        if self.prefix is not None:
+            sums = window_sums(
+                self.prefix,
+                cells,
+                self.cfar.guard_cell,
+                self.cfar.reference_cell,
+                self.received,
+                offset=self.history_start,
+                dtype=working_dtype(data),
+            )
+            threshold, noise = self.cfar.threshold_from_sums(*sums)
+        else:
+            threshold, noise = self._threshold_from_history(start, stop)
+
+        detections = make_detections(data, threshold, noise)
+        detections["index"][:, -1] += start
+        self.next_cell = stop
+        self._trim()
+        return detections
+
+    def _threshold_from_history(self, start, stop):
+        """保持しているデータ全体で判定し、対象セルだけ取り出す
+
+        保持範囲は対象セルの参照窓をすべて含むので、保持範囲の外を inf とみなしても
+        結果が変わるのはデータの両端（一括処理でも inf とみなす部分）だけ。
+        """
+        threshold, noise = self.cfar.threshold_and_noise(self.history)
+        local = slice(start - self.history_start, stop - self.history_start)
+        return threshold[..., local], noise[..., local]
+
+    def _trim(self):
+        keep_from = max(self.next_cell - self.latency, 0)
+        drop = keep_from - self.history_start
+        if drop <= 0:
+            return
+        self.history = self.history[..., drop:]
+        if self.prefix is not None:
+            self.prefix = self.prefix[..., drop:]
+        self.history_start = keep_from
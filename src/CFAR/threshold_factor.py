@@ -0,0 +1,238 @@
+"""CFAR閾値係数の計算とキャッシュ
+
+いずれも「注目セル > 係数 * 雑音推定値」のときに誤警報確率が pfa となる係数を返す。
+shape を省略すると雑音は指数分布（平均電力）、指定すると形状パラメータ shape の
+ワイブル分布として解く。非線形方程式を解くのは重いので、threshold_factor() は
+プロセス内のLRUキャッシュと、ディスク上のキャッシュ (cache/threshold_factor.json) を使う。
+
+    python src/CFAR/threshold_factor.py --cfar_type weibull_cfar os_cfar --reference_cell 4 8 16 --pfa 1e-3 1e-4
+
+のようにして、よく使うパラメータの表を事前に作っておける。
+"""
+import argparse
+import functools
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from scipy.optimize import brentq
+from scipy.special import comb
+
+CACHE_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "threshold_factor.json"
+# モンテカルロで解くときの試行数（乱数は固定なので結果は毎回同じ）
+N_TRIALS = 100_000
+
+_disk_cache = None
+# ディスクキャッシュの読み込み・解く・書き込みをスレッド間で1つずつにする
+_disk_cache_lock = threading.RLock()
+
+
+def ca_factor(n, pfa):
+    """CA-CFAR: n セルの平均に掛ける係数"""
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return n * (pfa ** (-1.0 / n) - 1.0)
+
+
+def _so_pfa(t, n):
+    """SO-CFAR の誤警報確率（t は片側 n セルの合計に掛ける係数）"""
+    k = np.arange(n)
+    return 2.0 * (2.0 + t) ** -n * np.sum(comb(n - 1 + k, k) * (2.0 + t) ** -k)
+
+
+def _go_pfa(t, n):
+    return 2.0 * (1.0 + t) ** -n - _so_pfa(t, n)
+
+
+def _solve(pfa_function, pfa, lower=0.0):
+    """pfa_function(t) = pfa を解く（pfa_function は t について減少）"""
+    while pfa_function(lower) < pfa:
+        lower = 2.0 * lower - 1.0
+    upper = max(lower, 0.0) + 1.0
+    while pfa_function(upper) > pfa:
+        upper *= 2.0
+    return brentq(lambda t: pfa_function(t) - pfa, lower, upper)
+
+
+def go_factor(n, pfa):
+    """GO-CFAR: 片側 n セルの平均の大きい方に掛ける係数"""
+    return n * _solve(lambda t: _go_pfa(t, n), pfa)
+
+
+def so_factor(n, pfa):
+    """SO-CFAR: 片側 n セルの平均の小さい方に掛ける係数"""
+    return n * _solve(lambda t: _so_pfa(t, n), pfa)
+
+
+def os_factor(n, rank, pfa):
+    """OS-CFAR: n セル中 rank 番目に小さい値に掛ける係数"""
+    i = np.arange(rank)
+    return _solve(lambda t: np.prod((n - i) / (n - i + t)), pfa)
+
+
+def weibull_factor(n, pfa):
+    """ワイブルCFAR: log T = mean(log x) + 係数 * std(log x) の係数
+
+    log x の平均・標準偏差で正規化した検定は尺度・形状によらないので、
+    指数分布の参照セルで E[exp(-exp(mean + t * std))] = pfa を解けばよい。
+    """
+    log_reference = np.log(np.random.default_rng(0).exponential(size=(N_TRIALS, n)))
+    mean = log_reference.mean(axis=1)
+    std = log_reference.std(axis=1)
+    return _solve(lambda t: np.mean(np.exp(-np.exp(mean + t * std))), pfa, lower=-1.0)
+
+
+def _weibull_clutter_factor(cfar_type, n, pfa, rank, shape):
+    """形状パラメータ shape のワイブル雑音で E[exp(-(係数 * 雑音推定値)^shape)] = pfa を解く"""
+    rng = np.random.default_rng(0)
+    if cfar_type in ("go_cfar", "so_cfar"):
+        reference = rng.weibull(shape, size=(N_TRIALS, 2, n)).mean(axis=2)
+        estimate = reference.max(axis=1) if cfar_type == "go_cfar" else reference.min(axis=1)
+    elif cfar_type == "os_cfar":
+        estimate = np.partition(rng.weibull(shape, size=(N_TRIALS, n)), rank - 1, axis=1)[:, rank - 1]
+    else:
+        estimate = rng.weibull(shape, size=(N_TRIALS, n)).mean(axis=1)
+    return _solve(lambda t: np.mean(np.exp(-((t * estimate) ** shape))), pfa)
+
+
+def solve_factor(cfar_type, n, pfa, rank=None, shape=None):
+    """キャッシュを使わずに係数を解く
+
+    n は ca/os/weibull_cfar では参照セルの総数、go/so_cfar では片側のセル数。
+    """
+    if cfar_type == "weibull_cfar":
+        return weibull_factor(n, pfa)
+    if shape is not None:
+        return _weibull_clutter_factor(cfar_type, n, pfa, rank, shape)
+    if cfar_type == "ca_cfar":
+        return float(ca_factor(n, pfa))
+    if cfar_type == "go_cfar":
+        return go_factor(n, pfa)
+    if cfar_type == "so_cfar":
+        return so_factor(n, pfa)
+    if cfar_type == "os_cfar":
+        return os_factor(n, rank, pfa)
+    raise ValueError(f"未対応のCFARです: {cfar_type}")
+
+
+def _cache_key(cfar_type, n, pfa, rank, shape):
+    """ディスクキャッシュのキー（閉じた式で求まる CA-CFAR は None）"""
+    if cfar_type == "weibull_cfar":
+        shape = None  # ワイブルCFARの係数は形状パラメータによらない
+    pfa = float(pfa)
+    shape = None if shape is None else float(shape)
+    if cfar_type == "ca_cfar" and shape is None:
+        return None
+    return f"{cfar_type}|n={n}|rank={rank}|pfa={pfa!r}|shape={shape!r}"
+
+
+def _load_disk_cache():
+    global _disk_cache
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            _disk_cache = {}
+            if CACHE_PATH.is_file():
+                with open(CACHE_PATH, "r") as file:
+                    _disk_cache = json.load(file)
+        return _disk_cache
+
+
+def _save_disk_cache(entries):
+    """他のプロセスが書いた分と合わせて、一時ファイル経由で書き換える（ファイル全体を書くので、
+    多数の係数はまとめて渡す）"""
+    with _disk_cache_lock:
+        cache = _load_disk_cache()
+        if CACHE_PATH.is_file():
+            with open(CACHE_PATH, "r") as file:
+                cache.update(json.load(file))
+        cache.update(entries)
+        snapshot = dict(cache)
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # 一時ファイルの名前はスレッド・プロセスごとに別にする
+        with tempfile.NamedTemporaryFile(
+            "w", dir=CACHE_PATH.parent, prefix=f"{CACHE_PATH.name}.", suffix=".tmp", delete=False
+        ) as file:
+            json.dump(snapshot, file, indent=1, sort_keys=True)
+        try:
+            os.replace(file.name, CACHE_PATH)
+        except BaseException:
+            os.remove(file.name)
+            raise
+
+
+@functools.lru_cache(maxsize=4096)
+def threshold_factor(cfar_type, n, pfa, rank=None, shape=None):
+    """キャッシュ付きで係数を求める（引数は solve_factor と同じ）"""
+    key = _cache_key(cfar_type, n, pfa, rank, shape)
+    if key is None:
+        return float(ca_factor(n, pfa))  # 閉じた式なのでキャッシュしない
+    with _disk_cache_lock:
+        cache = _load_disk_cache()
+        if key not in cache:
+            _save_disk_cache({key: solve_factor(cfar_type, n, pfa, rank, shape)})
+        return cache[key]
+
+
+def factors_for_counts(count, factor):
+    """参照セル数ごとに factor(n) を求め、count と同じ形で返す（同じセル数は1回だけ解く）"""
+    counts, inverse = np.unique(count, return_inverse=True)
+    return np.array([factor(int(n)) for n in counts])[inverse].reshape(np.shape(count))
+
+
+def default_rank(reference_cell):
+    """OS-CFAR で一般的に使われる参照セル数の3/4"""
+    return max(1, (2 * reference_cell * 3) // 4)
+
+
+def pregenerate(cfar_types, reference_cells, pfas, shapes=(None,)):
+    """パラメータの組み合わせごとに係数を解いてディスクキャッシュに入れる
+
+    新しく解いた係数は最後に1回だけまとめて書き込む。
+    """
+    cache = _load_disk_cache()
+    solved = {}
+    entries = 0
+    for cfar_type in cfar_types:
+        for reference_cell in reference_cells:
+            if cfar_type in ("go_cfar", "so_cfar"):
+                windows = [(reference_cell, None)]
+            elif cfar_type == "os_cfar":
+                windows = [(2 * reference_cell, default_rank(reference_cell))]
+            else:
+                # 端のセルは片側の参照窓が欠けるので、その分のセル数も作る
+                windows = [(n, None) for n in range(max(reference_cell, 2), 2 * reference_cell + 1)]
+            for n, rank in windows:
+                for pfa in pfas:
+                    for shape in shapes:
+                        key = _cache_key(cfar_type, n, pfa, rank, shape)
+                        if key is not None and key not in cache and key not in solved:
+                            solved[key] = solve_factor(cfar_type, n, pfa, rank, shape)
+                        entries += 1
+    if solved:
+        _save_disk_cache(solved)
+    return entries
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--cfar_type", type=str, nargs="+", default=["ca_cfar", "go_cfar", "so_cfar", "os_cfar", "weibull_cfar"])
+    parser.add_argument("--reference_cell", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--pfa", type=float, nargs="+", default=[1e-2, 1e-3, 1e-4, 1e-5, 1e-6])
+    parser.add_argument("--shape", type=float, nargs="*", default=[], help="ワイブル雑音の形状パラメータ（省略時は指数分布）")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    shapes = [None] + args.shape
+    entries = pregenerate(args.cfar_type, args.reference_cell, args.pfa, shapes)
+    print(f"{entries} 件の係数を {CACHE_PATH} に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
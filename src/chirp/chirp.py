@@ -2,6 +2,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import chirp
 import argparse
+import sys
+from pathlib import Path
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.decimated_plot import DecimatedLine
+from common.precision import real_dtype
 
 
 def parse_arguments():
@@ -20,16 +31,19 @@ def make_chirp(args):
     t = np.arange(args.N) * args.T  # timestamps
     y = chirp(t, f0=args.f0, f1=args.f1, t1=args.N * args.T, method="linear")
     f = args.f0 + (args.f1 - args.f0) / (args.N * args.T) * t
-    return t, y, f
+    # 波形と周波数は精度設定の型にする（時刻は長い系列で丸めが目立つので float64 のまま）
+    return t, y.astype(real_dtype()), f.astype(real_dtype())
 
 
 def plot_graph(t, y, f):
+    """長い波形でも表示範囲を間引いて描く（ズーム・パンで間引き直す）"""
     fig = plt.figure()
     ax1 = fig.add_subplot(2, 1, 1)
-    ax1.plot(t, y)
     ax2 = fig.add_subplot(2, 1, 2)
-    ax2.plot(t, f)
+    # 間引き直しのコールバックは弱参照なので、表示している間は変数で持っておく
+    lines = [DecimatedLine(ax1, t, y), DecimatedLine(ax2, t, f)]
     plt.show()
+    return lines
 
 
 def main():
@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+import scipy.fft
+from scipy.signal import get_window
+
+from chirp import parse_arguments
+from common.precision import complex_dtype
+
+
+def make_replica(n_samples, sample_period, f0, f1, window=None, dtype=None):
+    """複素ベースバンドのLFMチャープ（パルス圧縮の参照信号）
+
+    Args:
+        window: 振幅に掛ける窓関数の名前（"hamming", ("kaiser", 6) など）。サイドローブを下げる。
+        dtype: 省略すると精度設定の複素数型
+    """
+    t = np.arange(n_samples) * sample_period
+    rate = (f1 - f0) / (n_samples * sample_period)
+    replica = np.exp(2j * np.pi * (f0 * t + 0.5 * rate * t * t))
+    if window is not None:
+        replica *= get_window(window, n_samples, fftbins=False)
+    return replica.astype(dtype or complex_dtype())
+
+
+def matched_filter_spectrum(replica, n_fft, workers=-1):
+    """整合フィルタ conj(replica[::-1]) を n_fft 点でFFTしたもの"""
+    return scipy.fft.fft(np.conj(replica[::-1]), n_fft, workers=workers)
+
+
+class PulseCompressor:
+    """(pulses, samples) のブロックをFFTによる高速畳み込みでまとめて整合フィルタ処理する
+
+    出力 y[..., n] = Σ_m x[..., n + m] * conj(replica[m]) は入力と同じ長さで、
+    目標の先頭サンプル位置にピークが立つ。短いレコードは1回のFFTで、
+    長いレコードはオーバーラップセーブ法でブロックに分けて処理する。
+    参照信号のスペクトルはFFT長ごとにキャッシュし、FFTプラン自体は
+    scipy.fft (pocketfft) のプランキャッシュで再利用される。
+    """
+
+    def __init__(self, replica, block_size=None, workers=-1, spectrum_source=None):
+        """
+        Args:
+            spectrum_source: FFT長を受け取って整合フィルタのスペクトルを返す関数
+                (WaveformBank のキャッシュを共有する場合など)。省略時はインスタンスごとにキャッシュする。
+        """
+        self.replica = np.asarray(replica)
+        self.workers = workers
+        # オーバーラップセーブのFFT長（参照信号長の8倍程度が効率が良い）
+        self.block_size = block_size or scipy.fft.next_fast_len(8 * len(self.replica))
+        self.spectrum_source = spectrum_source
+        self._spectra = {}
+
+    def spectrum(self, n_fft):
+        """整合フィルタ conj(replica[::-1]) の周波数特性"""
+        if self.spectrum_source is not None:
+            return self.spectrum_source(n_fft)
+        if n_fft not in self._spectra:
+            self._spectra[n_fft] = matched_filter_spectrum(self.replica, n_fft, self.workers)
+        return self._spectra[n_fft]
+
+    def compress(self, pulses):
+        pulses = np.asarray(pulses)
+        n_samples = pulses.shape[-1]
+        if n_samples + len(self.replica) - 1 <= self.block_size:
+            return self._compress_direct(pulses)
+        return self._compress_overlap_save(pulses)
+
+    def _compress_direct(self, pulses):
+        n_samples = pulses.shape[-1]
+        delay = len(self.replica) - 1
+        n_fft = scipy.fft.next_fast_len(n_samples + delay)
+        spectrum = scipy.fft.fft(pulses, n_fft, axis=-1, workers=self.workers)
+        spectrum *= self.spectrum(n_fft).astype(spectrum.dtype, copy=False)
+        full = scipy.fft.ifft(spectrum, axis=-1, overwrite_x=True, workers=self.workers)
+        return full[..., delay : delay + n_samples]
+
+    def _compress_overlap_save(self, pulses):
+        n_samples = pulses.shape[-1]
+        delay = len(self.replica) - 1
+        n_fft = self.block_size
+        step = n_fft - delay
+        n_blocks = -(-n_samples // step)
+
+        padded = np.zeros(
+            pulses.shape[:-1] + ((n_blocks - 1) * step + n_fft,),
+            dtype=np.result_type(pulses.dtype, np.complex64),
+        )
+        padded[..., :n_samples] = pulses
+        blocks = np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=-1)[..., ::step, :]
+
+        spectrum = scipy.fft.fft(blocks, axis=-1, workers=self.workers)
+        spectrum *= self.spectrum(n_fft).astype(spectrum.dtype, copy=False)
+        output = scipy.fft.ifft(spectrum, axis=-1, overwrite_x=True, workers=self.workers)
+        # 各ブロックの循環畳み込みのうち、折り返しの無い末尾 step サンプルだけを使う
+        output = output[..., delay:].reshape(pulses.shape[:-1] + (n_blocks * step,))
+        return output[..., :n_samples]
+
+
+def main():
+    args = parse_arguments()
+    replica = make_replica(args.N, args.T, args.f0, args.f1, window="hamming")
+    compressor = PulseCompressor(replica)
+
+    rng = np.random.default_rng(0)
+    shape = (64, 100 * args.N)
+    pulses = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+    pulses[:, 5000 : 5000 + args.N] += 10.0 * replica
+
+    start = time.perf_counter()
+    compressed = compressor.compress(pulses)
+    fft_time = time.perf_counter() - start
+    print(f"FFT: {pulses.size / fft_time / 1e6:.1f} Msamples/s, peak at {np.argmax(np.abs(compressed[0]))}")
+
+    start = time.perf_counter()
+    np.convolve(pulses[0], np.conj(replica[::-1]))
+    convolve_time = (time.perf_counter() - start) * shape[0]
+    print(f"np.convolve: {pulses.size / convolve_time / 1e6:.1f} Msamples/s")
+
+
+if __name__ == "__main__":
+    main()
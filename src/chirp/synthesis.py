@@ -0,0 +1,125 @@
+"""複数パルス（CPI）のチャープ受信信号をまとめて生成する
+
+パルスごとに開始周波数・チャープレート・遅延・ドップラー位相・振幅を変えられるので、
+ステップ周波数の送信や移動目標を含むテストデータを1回の呼び出しで作れる。
+
+    python src/chirp/synthesis.py --pulses 5000 --samples 5000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.precision import complex_dtype
+
+
+def doppler_phases(n_pulses, doppler_frequency, pri):
+    """ドップラー周波数 doppler_frequency [Hz] の目標のパルスごとの位相 [rad]"""
+    return 2.0 * np.pi * doppler_frequency * pri * np.arange(n_pulses)
+
+
+def synthesize_pulses(
+    n_samples,
+    sample_period,
+    pulse_width,
+    f0,
+    rate,
+    delay=0.0,
+    phase=0.0,
+    amplitude=1.0,
+    noise_power=0.0,
+    n_pulses=None,
+    rng=None,
+    dtype=None,
+    max_chunk_bytes=64 * 1024**2,
+):
+    """(n_pulses, n_samples) の受信信号を生成する
+
+    f0, rate, delay, phase, amplitude はスカラーまたはパルス数の長さの配列。
+    パルス m のサンプル n は、tau = n * sample_period - delay[m] が 0 <= tau < pulse_width のとき
+    amplitude[m] * exp(j(2π(f0[m] tau + rate[m] tau² / 2) + phase[m])) となり、
+    そこに電力 noise_power の複素ガウス雑音を加える。
+    位相は float64 で計算して 2π で折り返してから dtype の精度に落とす。
+
+    Args:
+        n_pulses: 省略時はパルスごとのパラメータの長さ
+        dtype: np.complex64 または np.complex128（省略すると精度設定の複素数型）
+        max_chunk_bytes: 一時配列がこのサイズ程度になるようにパルス方向に分けて計算する
+    """
+    dtype = np.dtype(dtype or complex_dtype())
+    if dtype.kind != "c":
+        raise ValueError(f"dtype は複素数型で指定してください: {dtype}")
+    per_pulse = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(p, dtype=np.float64)) for p in (f0, rate, delay, phase, amplitude))
+    )
+    if n_pulses is None:
+        n_pulses = len(per_pulse[0])
+    f0, rate, delay, phase, amplitude = (np.broadcast_to(p, (n_pulses,)) for p in per_pulse)
+    rng = rng if rng is not None else np.random.default_rng()
+
+    real_dtype = dtype.type(0).real.dtype
+    output = np.empty((n_pulses, n_samples), dtype=dtype)
+    t = np.arange(n_samples) * sample_period
+    rows = max(1, max_chunk_bytes // (16 * max(n_samples, 1)))
+    for start in range(0, n_pulses, rows):
+        chunk = slice(start, min(start + rows, n_pulses))
+        tau = t - delay[chunk, np.newaxis]
+        cycles = f0[chunk, np.newaxis] * tau + 0.5 * rate[chunk, np.newaxis] * tau * tau
+        cycles -= np.floor(cycles)
+        # パルスごとの位相（ドップラーで大きくなる）も含めて折り返してから精度を落とす
+        angle = np.mod(2.0 * np.pi * cycles + phase[chunk, np.newaxis], 2.0 * np.pi).astype(real_dtype)
+        block = output[chunk]
+        np.cos(angle, out=block.real)
+        np.sin(angle, out=block.imag)
+        block *= (amplitude[chunk, np.newaxis] * ((tau >= 0.0) & (tau < pulse_width))).astype(real_dtype)
+        if noise_power > 0.0:
+            noise = rng.standard_normal((block.shape[0], n_samples, 2), dtype=real_dtype)
+            noise *= real_dtype.type(np.sqrt(noise_power / 2.0))
+            block += noise.view(dtype)[..., 0]
+    return output
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--pulses", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--T", type=float, default=1e-7, help="sampling_cycle")
+    parser.add_argument("--pulse_width", type=float, default=1e-4)
+    parser.add_argument("--f0", type=float, nargs="+", default=[-2e6, -1e6, 0.0, 1e6], help="パルスごとに順に使う開始周波数（ステップ周波数）")
+    parser.add_argument("--bandwidth", type=float, default=1e6)
+    parser.add_argument("--pri", type=float, default=1e-3)
+    parser.add_argument("--doppler", type=float, default=100.0, help="目標のドップラー周波数 [Hz]")
+    parser.add_argument("--noise_power", type=float, default=0.1)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    f0 = np.resize(args.f0, args.pulses)
+    start = time.perf_counter()
+    pulses = synthesize_pulses(
+        args.samples,
+        args.T,
+        args.pulse_width,
+        f0,
+        args.bandwidth / args.pulse_width,
+        delay=1e-4,
+        phase=doppler_phases(args.pulses, args.doppler, args.pri),
+        noise_power=args.noise_power,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"{pulses.shape} {pulses.dtype}: {pulses.nbytes / 1e6:.0f} MB, {elapsed:.2f} s ({pulses.size / elapsed / 1e6:.1f} Msamples/s)")
+
+
+if __name__ == "__main__":
+    main()
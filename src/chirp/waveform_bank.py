@@ -0,0 +1,197 @@
+"""チャープ波形・参照信号・整合フィルタのスペクトルのキャッシュ
+
+同じ (N, T, f0, f1) の組み合わせを繰り返し使うので、生成した配列をパラメータごとに保持し、
+合計バイト数が max_bytes を超えたら古く使われたものから捨てる (LRU)。
+返す配列は書き込み禁止なので、コピーせずにスレッド間で共有できる。
+shared=True にすると配列を共有メモリに置き、spec() で得た (名前, 形, 型) を
+別プロセスに渡して attach() すればコピーせずに参照できる。
+"""
+import argparse
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from chirp import make_chirp
+from pulse_compression import PulseCompressor, make_replica, matched_filter_spectrum
+
+
+@dataclass(frozen=True)
+class ChirpParams:
+    N: int
+    T: float
+    f0: float
+    f1: float
+
+    @classmethod
+    def of(cls, params):
+        """ChirpParams または (N, T, f0, f1) のタプルから作る"""
+        return params if isinstance(params, cls) else cls(*params)
+
+
+@dataclass
+class _Entry:
+    arrays: tuple
+    nbytes: int
+    segments: list
+
+
+class WaveformBank:
+    def __init__(self, max_bytes=256 * 1024**2, shared=False):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._retired = []  # 捨てたが、まだ配列が参照されているかもしれない共有メモリ
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def chirp(self, params):
+        """実数のチャープ波形 (t, y, f)。make_chirp() と同じもの"""
+        params = ChirpParams.of(params)
+        return self._get(("chirp", params), lambda: make_chirp(argparse.Namespace(**vars(params))))
+
+    def replica(self, params, window=None):
+        """複素ベースバンドの参照信号（精度設定の複素数型）"""
+        params = ChirpParams.of(params)
+        return self._get(
+            ("replica", params, window),
+            lambda: (make_replica(params.N, params.T, params.f0, params.f1, window),),
+        )[0]
+
+    def spectrum(self, params, n_fft, window=None):
+        """参照信号の整合フィルタを n_fft 点でFFTしたもの"""
+        params = ChirpParams.of(params)
+        return self._get(
+            ("spectrum", params, window, n_fft),
+            lambda: (matched_filter_spectrum(self.replica(params, window), n_fft),),
+        )[0]
+
+    def compressor(self, params, window=None, block_size=None):
+        """スペクトルをこのバンクから取る PulseCompressor"""
+        params = ChirpParams.of(params)
+        return PulseCompressor(
+            self.replica(params, window),
+            block_size=block_size,
+            spectrum_source=lambda n_fft: self.spectrum(params, n_fft, window),
+        )
+
+    def spec(self, key):
+        """共有メモリに置いた配列を別プロセスで attach() するための (名前, 形, 型) の組"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not entry.segments:
+            raise ValueError(f"共有メモリ上にない波形です: {key}")
+        return tuple(
+            (segment.name, array.shape, array.dtype.str)
+            for segment, array in zip(entry.segments, entry.arrays)
+        )
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire(entry)
+            self._entries.clear()
+            self.nbytes = 0
+        self._close_retired()
+
+    def _get(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.arrays
+            self.misses += 1
+
+        # 生成はロックの外で行う（同時に同じものを作った場合は先に登録された方を使う）
+        entry = self._make_entry(compute())
+        with self._lock:
+            if key in self._entries:
+                self._retire(entry)
+                return self._entries[key].arrays
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self._retire(evicted)
+        self._close_retired()
+        return entry.arrays
+
+    def _make_entry(self, arrays):
+        segments = []
+        if self.shared:
+            shared_arrays = []
+            for array in arrays:
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+                shared_array[...] = array
+                segments.append(segment)
+                shared_arrays.append(shared_array)
+            arrays = shared_arrays
+        arrays = tuple(np.ascontiguousarray(array) for array in arrays)
+        for array in arrays:
+            array.flags.writeable = False
+        return _Entry(arrays, sum(array.nbytes for array in arrays), segments)
+
+    def _retire(self, entry):
+        for segment in entry.segments:
+            segment.unlink()
+        self._retired.extend(entry.segments)
+
+    def _close_retired(self):
+        """もう配列から参照されていない共有メモリを閉じる"""
+        with self._lock:
+            retired, self._retired = self._retired, []
+        still_used = []
+        for segment in retired:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment)
+        with self._lock:
+            self._retired.extend(still_used)
+
+
+# 別プロセスで attach() した共有メモリ（配列が使われている間は閉じない）
+_attached = {}
+
+
+def attach(spec):
+    """WaveformBank.spec() の組から書き込み禁止の配列を作る（コピーしない）"""
+    arrays = []
+    for name, shape, dtype in spec:
+        if name not in _attached:
+            _attached[name] = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf)
+        array.flags.writeable = False
+        arrays.append(array)
+    return tuple(arrays)
+
+
+# プロセス内で共有する既定のバンク
+default_bank = WaveformBank()
+
+
+def main():
+    params = ChirpParams(N=1000, T=0.01, f0=-30, f1=30)
+    compressor = default_bank.compressor(params, window="hamming")
+    pulses = np.zeros((16, 4096), dtype=np.complex64)
+    pulses[:, 100 : 100 + params.N] = default_bank.replica(params, "hamming")
+    for _ in range(3):
+        compressor.compress(pulses)
+    print(
+        f"{len(default_bank)} 件, {default_bank.nbytes / 1e6:.2f} MB, "
+        f"ヒット {default_bank.hits} / ミス {default_bank.misses}"
+    )
+
+
+if __name__ == "__main__":
+    main()
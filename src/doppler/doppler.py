@@ -0,0 +1,102 @@
+"""パルス圧縮後の (pulses, samples) ブロックからレンジ・ドップラーマップを作る
+
+出力は (CPI, doppler, range) の電力 |X|² で、CACFAR2D などにそのまま渡せる。
+
+    python src/doppler/doppler.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import scipy.fft
+from scipy.signal import get_window
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリと、隣のディレクトリ（チャープ生成・パルス圧縮）を追加
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src" / "chirp"))
+
+from common.precision import complex_dtype
+from pulse_compression import PulseCompressor, make_replica
+from synthesis import doppler_phases, synthesize_pulses
+
+
+class RangeDopplerProcessor:
+    """スロータイム（パルス方向）の窓掛け・FFT・電力計算をまとめて行う
+
+    入力は (pulses, samples) または (CPI, pulses, samples) の複素配列。
+    dtype=np.complex64（精度設定の既定）なら窓掛けからFFTまで単精度で計算し、出力は float32 になる。
+    ドップラー0が中央に来るように並べ替える (fftshift) が、パルス数が偶数のときは
+    窓に (-1)^m を掛けておくことで、並べ替えのコピーを省いている。
+    """
+
+    def __init__(self, n_pulses, window="hann", shift=True, dtype=None, workers=-1):
+        self.n_pulses = n_pulses
+        self.shift = shift
+        self.dtype = np.dtype(dtype or complex_dtype())
+        self.workers = workers
+        taper = np.ones(n_pulses) if window is None else get_window(window, n_pulses)
+        self._modulated = shift and n_pulses % 2 == 0
+        if self._modulated:
+            taper = taper * (-1.0) ** np.arange(n_pulses)
+        self.taper = taper.astype(self.dtype.type(0).real.dtype)[:, np.newaxis]
+
+    def process(self, pulses, out=None, overwrite=False):
+        """レンジ・ドップラーマップ（電力）を返す
+
+        Args:
+            out: 結果を書き込む実数配列（省略時は新しく確保する）
+            overwrite: True で入力が dtype と同じ型なら、窓掛けとFFTを入力の配列上で行う（入力は壊れる）
+        """
+        pulses = np.asarray(pulses)
+        if pulses.shape[-2] != self.n_pulses:
+            raise ValueError(f"パルス数が {self.n_pulses} ではありません: {pulses.shape}")
+        if overwrite and pulses.dtype == self.dtype and pulses.flags.writeable:
+            pulses *= self.taper
+            spectrum = pulses
+        else:
+            spectrum = np.multiply(pulses, self.taper, dtype=self.dtype)
+        spectrum = scipy.fft.fft(spectrum, axis=-2, overwrite_x=True, workers=self.workers)
+
+        if out is None:
+            out = np.empty(spectrum.shape, dtype=spectrum.real.dtype)
+        np.square(spectrum.real, out=out)
+        out += np.square(spectrum.imag)
+        if self.shift and not self._modulated:
+            out[...] = scipy.fft.fftshift(out, axes=-2)
+        return out
+
+    def doppler_frequencies(self, pri):
+        """出力のドップラー軸の周波数 [Hz]"""
+        frequencies = scipy.fft.fftfreq(self.n_pulses, pri)
+        return scipy.fft.fftshift(frequencies) if self.shift else frequencies
+
+
+def main():
+    n_pulses, n_samples, pulse_length = 64, 2048, 128
+    pri, sample_period = 1e-3, 1e-6
+    rate = 1e5 / (pulse_length * sample_period)
+    pulses = synthesize_pulses(
+        n_samples,
+        sample_period,
+        pulse_length * sample_period,
+        -5e4,
+        rate,
+        delay=500 * sample_period,
+        phase=doppler_phases(n_pulses, 250.0, pri),
+        noise_power=1.0,
+        n_pulses=n_pulses,
+        rng=np.random.default_rng(0),
+    )
+    compressor = PulseCompressor(make_replica(pulse_length, sample_period, -5e4, 5e4, window="hamming"))
+    processor = RangeDopplerProcessor(n_pulses)
+    power = processor.process(compressor.compress(pulses), overwrite=True)
+
+    doppler, range_ = np.unravel_index(np.argmax(power), power.shape)
+    print(f"{power.shape} {power.dtype}: ピーク レンジ {range_}, ドップラー {processor.doppler_frequencies(pri)[doppler]:.1f} Hz")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""YAMLで宣言した段をつないで、収録ファイルから検出結果までを流れ作業で処理する
+
+    python src/pipeline/pipeline.py --config setting/pipeline.yaml --input_file rec.bin --output_file det.bin
+
+段と段は上限付きのキューでつながり、各段は workers 個のスレッド
+（backend: process ならプロセス）でチャンク単位に並列処理する。
+後段が詰まるとキューが一杯になって前段が待つので、メモリ使用量は
+(段数 × queue_size) チャンク程度に収まる。書き出しの段では読み込み順に並べ直す。
+
+backend: process の段へは、共有メモリのリングバッファ (common.shared_ring) で
+チャンクを渡す。読み込みの段の直後ならファイルからスロットへ直接読み込み、
+process の段どうしは前段のワーカーが次段のスロットへ直接書くので、pickle しない。
+形が決まらない出力（検出結果）だけは multiprocessing.Queue で戻す。
+"""
+import argparse
+import dataclasses
+import itertools
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.shared_ring import SharedRing
+from common.throughput import ThroughputMeter
+from pipeline_config import load_pipeline_config
+from stages import STAGE_TYPES, create_stage
+
+# キューの空き・到着を待つ間隔（停止要求を確認する間隔）[s]
+POLL_INTERVAL = 0.1
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--config", type=str, default=None, help="パイプラインの設定ファイル（既定: setting/pipeline.yaml）")
+    parser.add_argument("--input_file", type=str, default=None, help="設定ファイルの input_file の代わりに使う")
+    parser.add_argument("--output_file", type=str, default=None, help="設定ファイルの output_file の代わりに使う")
+
+    return parser.parse_args()
+
+
+@dataclass(frozen=True)
+class Chunk:
+    sequence: int
+    n_records: int  # このチャンクのもとになったレコード数
+    data: object
+    created: float  # 読み込んだ時刻 (perf_counter)
+
+
+class StageStats:
+    """段ごとの処理数・処理時間・待ち時間"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.max_latency = 0.0
+        self.waiting = 0.0  # 入力を待った時間（前段が遅い）
+        self.blocked = 0.0  # 出力の空きを待った時間（後段が遅い = バックプレッシャー）
+        self._lock = threading.Lock()
+
+    def record(self, n_bytes, seconds):
+        with self._lock:
+            self.items += 1
+            self.bytes += n_bytes
+            self.busy += seconds
+            self.max_latency = max(self.max_latency, seconds)
+
+    def add_wait(self, waiting=0.0, blocked=0.0):
+        with self._lock:
+            self.waiting += waiting
+            self.blocked += blocked
+
+    def format(self, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        mean = self.busy / max(self.items, 1)
+        return (
+            f"{self.name:>10} x{self.workers}: {self.items} chunks, {self.bytes / 1e6:.1f} MB, "
+            f"{self.bytes / 1e6 / elapsed:.1f} MB/s, 処理 平均 {1e3 * mean:.1f} ms / 最大 {1e3 * self.max_latency:.1f} ms, "
+            f"稼働率 {100 * self.busy / (elapsed * self.workers):.0f}%, "
+            f"入力待ち {self.waiting:.2f} s, 出力待ち {self.blocked:.2f} s"
+        )
+
+
+def _nbytes(data):
+    return getattr(data, "nbytes", 0)
+
+
+# -------------------- プロセスで動かす段 --------------------
+
+
+def _ring_worker(config, stage, input_ring, output_ring, results):
+    """input_ring のスロットを処理し、output_ring（なければ results）へ渡す"""
+    try:
+        instance = create_stage(config, stage)
+        while True:
+            start = time.perf_counter()
+            item = input_ring.get()
+            waiting = time.perf_counter() - start
+            if item is None:
+                break
+            sequence, tag, n_records, data = item
+            start = time.perf_counter()
+            output = instance.process(data)
+            busy = time.perf_counter() - start
+            start = time.perf_counter()
+            if output_ring is not None:
+                if output_ring.put(output, tag=tag, info=n_records) is None:
+                    break
+            else:
+                if np.may_share_memory(output, data):
+                    output = output.copy()  # スロットを返したあとに pickle されるので
+                results.put(("chunk", tag, n_records, output))
+            blocked = time.perf_counter() - start
+            input_ring.release(sequence)
+            results.put(("stats", data.nbytes, busy, waiting, blocked))
+    except BaseException:
+        results.put(("error", f"{stage.name}: {traceback.format_exc()}"))
+        input_ring.abort()
+        if output_ring is not None:
+            output_ring.abort()
+    finally:
+        if output_ring is not None:
+            output_ring.close()
+        results.put(("done",))
+
+
+# -------------------- 実行 --------------------
+
+
+class PipelineRunner:
+    def __init__(self, config):
+        self.config = config
+        self.stop = threading.Event()
+        self.errors = []
+        self.queues = [queue.Queue(maxsize=config.queue_size) for _ in config.stages[:-1]]
+        self.stats = [StageStats(stage.name, stage.workers) for stage in config.stages]
+        self.latencies = []  # 読み込みから書き出しまでの時間 [s]
+        self.rings = {}  # 段の番号 -> その段への入力のリングバッファ
+        self._created = {}  # リングバッファに入れたチャンク番号 -> 読み込んだ時刻（結果を受け取ったら消す）
+        self._processes = []
+
+    def _get(self, source, stats):
+        start = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                try:
+                    return source.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            return None
+        finally:
+            stats.add_wait(waiting=time.perf_counter() - start)
+
+    def _put(self, target, item, stats):
+        start = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                try:
+                    target.put(item, timeout=POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.add_wait(blocked=time.perf_counter() - start)
+
+    def _fail(self, error):
+        """他の段も止めて、メインスレッドで再送出する"""
+        self.errors.append(error)
+        self.stop.set()
+        for ring in self.rings.values():
+            ring.abort()
+
+    def _thread(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except BaseException as error:
+                self._fail(error)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    # ---------- スレッドで動かす段 ----------
+
+    def _run_source(self, stage, output, stats):
+        try:
+            for sequence, data in enumerate(stage.chunks()):
+                chunk = Chunk(sequence, len(data), data, time.perf_counter())
+                stats.record(_nbytes(data), 0.0)
+                if not self._put(output, chunk, stats):
+                    break
+        finally:
+            self._put(output, None, stats)
+
+    def _run_source_into_ring(self, stage, ring, stats):
+        """リングバッファのスロットへファイルから直接読み込む"""
+        try:
+            with stage.open() as file:
+                for sequence in itertools.count():
+                    start = time.perf_counter()
+                    reserved = ring.reserve()
+                    stats.add_wait(blocked=time.perf_counter() - start)
+                    if reserved is None:
+                        break
+                    slot_sequence, slot = reserved
+                    start = time.perf_counter()
+                    n_records = stage.read_into(file, slot)
+                    if n_records:  # 0件のスロットは終わりの印で、結果は返ってこない
+                        self._created[sequence] = time.perf_counter()
+                    ring.commit(slot_sequence, n_rows=n_records, tag=sequence, info=n_records)
+                    if n_records == 0:
+                        break
+                    stats.record(slot[:n_records].nbytes, time.perf_counter() - start)
+        finally:
+            ring.close()
+
+    def _run_transform(self, process, source, output, stats, remaining):
+        while (chunk := self._get(source, stats)) is not None:
+            start = time.perf_counter()
+            data = process(chunk.data)
+            stats.record(_nbytes(chunk.data), time.perf_counter() - start)
+            if not self._put(output, dataclasses.replace(chunk, data=data), stats):
+                return
+        # 同じ段の他のワーカーにも終わりを知らせ、最後の1つが次の段に伝える
+        self._put(source, None, stats)
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            last = remaining["count"] == 0
+        if last:
+            self._put(output, None, stats)
+
+    def _run_feeder(self, source, ring, stats):
+        """スレッドの段の出力を、次の process の段のリングバッファへコピーする"""
+        try:
+            while (chunk := self._get(source, stats)) is not None:
+                start = time.perf_counter()
+                self._created[chunk.sequence] = chunk.created
+                if ring.put(chunk.data, tag=chunk.sequence, info=chunk.n_records) is None:
+                    break
+                stats.add_wait(blocked=time.perf_counter() - start)
+        finally:
+            ring.close()
+
+    def _run_collector(self, stage, results, output, stats):
+        """process の段のワーカーからの結果・統計・終了を受け取る"""
+        done = 0
+        while done < stage.workers and not self.stop.is_set():
+            try:
+                message = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if message[0] == "chunk":
+                _, sequence, n_records, data = message
+                chunk = Chunk(sequence, n_records, data, self._created.pop(sequence))
+                if not self._put(output, chunk, stats):
+                    return
+            elif message[0] == "stats":
+                _, n_bytes, busy, waiting, blocked = message
+                stats.record(n_bytes, busy)
+                stats.add_wait(waiting, blocked)
+            elif message[0] == "error":
+                raise RuntimeError(message[1])
+            else:
+                done += 1
+        if output is not None:
+            self._put(output, None, stats)
+
+    def _run_sink(self, stage, source, stats, meter):
+        pending = {}
+        next_sequence = 0
+        while (chunk := self._get(source, stats)) is not None:
+            pending[chunk.sequence] = chunk
+            while next_sequence in pending:
+                chunk = pending.pop(next_sequence)
+                start = time.perf_counter()
+                stage.write(chunk.data, chunk.n_records)
+                stats.record(_nbytes(chunk.data), time.perf_counter() - start)
+                self.latencies.append(time.perf_counter() - chunk.created)
+                meter.update(chunk.n_records)
+                next_sequence += 1
+
+    # ---------- 組み立て ----------
+
+    def _create_rings(self, instances):
+        """process の段の入力ごとに、前段の出力の形でリングバッファを作る"""
+        stages = self.config.stages
+        spec = instances[0].output_spec()
+        for i, stage in enumerate(stages[1:-1], start=1):
+            if stage.backend == "process":
+                if spec is None:
+                    raise ValueError(f"{stage.name}: 前段の出力の形が決まらないので backend: process にできません。")
+                previous = stages[i - 1]
+                producers = previous.workers if previous.backend == "process" else 1
+                self.rings[i] = SharedRing(spec[0], spec[1], n_slots=self.config.queue_size, producers=producers)
+            spec = instances[i].output_spec(*spec) if spec is not None else None
+
+    def _start_process_stage(self, i, stage, threads):
+        next_ring = self.rings.get(i + 1)
+        output = None if next_ring is not None else self.queues[i]
+        results = multiprocessing.Queue(maxsize=4 * self.config.queue_size)
+        for _ in range(stage.workers):
+            process = multiprocessing.Process(
+                target=_ring_worker,
+                args=(self.config, stage, self.rings[i], next_ring, results),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        threads.append(self._thread(self._run_collector, stage, results, output, self.stats[i]))
+
+    def run(self):
+        stages = self.config.stages
+        instances = [create_stage(self.config, stage) for stage in stages]
+        source, sink = instances[0], instances[-1]
+        meter = ThroughputMeter(record_size=source.schema.dtype.itemsize, label="pipeline ")
+        start = time.perf_counter()
+        threads = []
+        try:
+            self._create_rings(instances)
+            if 1 in self.rings:
+                threads.append(self._thread(self._run_source_into_ring, source, self.rings[1], self.stats[0]))
+            else:
+                threads.append(self._thread(self._run_source, source, self.queues[0], self.stats[0]))
+
+            for i, stage in enumerate(stages[1:-1], start=1):
+                if stage.backend == "process":
+                    self._start_process_stage(i, stage, threads)
+                    continue
+                if i + 1 in self.rings:
+                    output = queue.Queue(maxsize=self.config.queue_size)
+                    threads.append(self._thread(self._run_feeder, output, self.rings[i + 1], self.stats[i]))
+                else:
+                    output = self.queues[i]
+                remaining = {"count": stage.workers, "lock": threading.Lock()}
+                for _ in range(stage.workers):
+                    threads.append(
+                        self._thread(
+                            self._run_transform,
+                            instances[i].process,
+                            self.queues[i - 1],
+                            output,
+                            self.stats[i],
+                            remaining,
+                        )
+                    )
+            threads.append(self._thread(self._run_sink, sink, self.queues[-1], self.stats[-1], meter))
+            for thread in threads:
+                thread.join()
+        finally:
+            self.stop.set()
+            for ring in self.rings.values():
+                ring.abort()
+            for process in self._processes:
+                process.join(timeout=5.0)
+                if process.is_alive():
+                    process.terminate()
+            for ring in self.rings.values():
+                ring.destroy()
+            sink.close()
+        if self.errors:
+            raise self.errors[0]
+
+        elapsed = time.perf_counter() - start
+        print(meter.format())
+        for stats in self.stats:
+            print(stats.format(elapsed))
+        if self.latencies:
+            print(f"読み込みから書き出しまで 平均 {1e3 * np.mean(self.latencies):.1f} ms / 最大 {1e3 * np.max(self.latencies):.1f} ms")
+        return sink
+
+
+def main():
+    args = parse_arguments()
+    config = load_pipeline_config(STAGE_TYPES, args.config)
+    overrides = {name: value for name in ("input_file", "output_file") if (value := getattr(args, name))}
+    config = dataclasses.replace(config, **overrides)
+    sink = PipelineRunner(config).run()
+    print(f"{sink.cpis} CPI, 検出 {sink.count} 件 -> {config.output_file}")
+
+
+if __name__ == "__main__":
+    main()
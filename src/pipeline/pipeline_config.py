@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from common.load_yaml import load_yaml
+
+# 現在のファイル位置から3階層上のディレクトリ（プロジェクトルート）
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CONFIG_PATH = PROJECT_ROOT / "setting" / "pipeline.yaml"
+
+BACKENDS = ("thread", "process")
+
+
+@dataclass(frozen=True)
+class StageConfig:
+    name: str
+    type: str
+    workers: int = 1
+    backend: str = "thread"
+    params: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    input_file: str
+    output_file: str
+    schema: str
+    queue_size: int
+    stages: tuple
+
+
+def resolve_path(path):
+    """相対パスはプロジェクトルートから探す"""
+    path = Path(path)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def parse_pipeline_config(yaml_data, stage_types):
+    """YAMLの内容を検証して PipelineConfig にする（stage_types は使える段の種類）"""
+    data = yaml_data.get("pipeline") if isinstance(yaml_data, dict) else None
+    if not isinstance(data, dict) or not isinstance(data.get("stages"), list):
+        raise ValueError("pipeline.stages がありません。")
+
+    stages = []
+    for i, spec in enumerate(data["stages"]):
+        spec = dict(spec or {})
+        where = f"pipeline.stages[{i}]"
+        stage = StageConfig(
+            name=spec.pop("name", f"stage{i}"),
+            type=spec.pop("type", None),
+            workers=spec.pop("workers", 1),
+            backend=spec.pop("backend", "thread"),
+            params=dict(spec.pop("params", None) or {}),
+        )
+        if spec:
+            raise ValueError(f"{where}: 不明な項目 {sorted(spec)}")
+        if stage.type not in stage_types:
+            raise ValueError(f"{where}.type: {stage.type!r} (使える段: {list(stage_types)})")
+        if not isinstance(stage.workers, int) or stage.workers < 1:
+            raise ValueError(f"{where}.workers は 1 以上の整数で指定してください。")
+        if stage.backend not in BACKENDS:
+            raise ValueError(f"{where}.backend: {stage.backend!r} (使えるもの: {list(BACKENDS)})")
+        stages.append(stage)
+
+    if len(stages) < 2:
+        raise ValueError("pipeline.stages には読み込みと書き出しの2段以上が必要です。")
+    for stage, role in ((stages[0], "source"), (stages[-1], "sink")):
+        if stage_types[stage.type].role != role:
+            raise ValueError(f"{stage.name} ({stage.type}) は{'先頭' if role == 'source' else '末尾'}に置けません。")
+        if stage.workers != 1 or stage.backend != "thread":
+            raise ValueError(f"{stage.name}: 読み込み・書き出しの段は1スレッドで動かします。")
+    for stage in stages[1:-1]:
+        if stage_types[stage.type].role != "transform":
+            raise ValueError(f"{stage.name} ({stage.type}) は途中の段に置けません。")
+
+    queue_size = data.get("queue_size", 4)
+    if not isinstance(queue_size, int) or queue_size < 1:
+        raise ValueError("pipeline.queue_size は 1 以上の整数で指定してください。")
+    for name in ("input_file", "output_file"):
+        if not isinstance(data.get(name), str):
+            raise ValueError(f"pipeline.{name} がありません。")
+    return PipelineConfig(
+        input_file=str(resolve_path(data["input_file"])),
+        output_file=str(resolve_path(data["output_file"])),
+        schema=str(resolve_path(data.get("schema", "setting/frame.yaml"))),
+        queue_size=queue_size,
+        stages=tuple(stages),
+    )
+
+
+def load_pipeline_config(stage_types, yaml_file_path=None):
+    path = resolve_path(yaml_file_path) if yaml_file_path else DEFAULT_CONFIG_PATH
+    return parse_pipeline_config(load_yaml(path), stage_types)
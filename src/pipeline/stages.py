@@ -0,0 +1,179 @@
+"""パイプラインの各段
+
+role が "source" の段は chunks() でデータを出し、"transform" の段は process() で
+1チャンクずつ変換し、"sink" の段は write() で書き出す。
+チャンクは read_records では (レコード数,) の構造化配列、decode 以降は
+(CPI, pulses, samples) の配列になる。
+output_spec() は出力チャンクの最大の (形, 型) で、共有メモリのリングバッファの
+スロットを作るのに使う（形が決まらない出力は None）。
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリと、各処理のディレクトリを追加
+sys.path.append(str(project_root))
+for directory in ("chirp", "doppler", "CFAR"):
+    sys.path.append(str(project_root / "src" / directory))
+
+from common.frame import apply_transforms, load_frame_schema, read_records_into
+from common.precision import complex_dtype, real_dtype
+from cfar_factory import create_cfar
+from dataclass import load_cfar_config
+from detection import detection_dtype
+from doppler import RangeDopplerProcessor
+from waveform_bank import ChirpParams, default_bank
+
+
+class ReadRecords:
+    """収録ファイルを cpis_per_chunk 個のCPI分ずつ読む（末尾の不完全なCPIは捨てる）"""
+
+    role = "source"
+
+    def __init__(self, config, pulses, cpis_per_chunk=8):
+        self.input_file = config.input_file
+        self.schema = load_frame_schema(config.schema)
+        self.pulses = pulses
+        self.chunk_records = pulses * cpis_per_chunk
+
+    def output_spec(self):
+        return (self.chunk_records,), self.schema.dtype
+
+    def open(self):
+        return open(self.input_file, "rb")
+
+    def read_into(self, file, buffer):
+        """buffer（リングバッファのスロットなど）に直接読み込み、使えるレコード数を返す"""
+        n_records = read_records_into(file, buffer)
+        return n_records - n_records % self.pulses
+
+    def chunks(self):
+        with self.open() as file:
+            while True:
+                buffer = np.empty(self.chunk_records, dtype=self.schema.dtype)
+                n_records = self.read_into(file, buffer)
+                if n_records == 0:
+                    break
+                yield buffer[:n_records]
+
+
+class Decode:
+    """レコードの変換を適用し、field を (CPI, pulses, samples) の複素数（精度設定の型）にする"""
+
+    role = "transform"
+
+    def __init__(self, config, field="data", offset=0, pulses=None, transforms=True):
+        self.schema = load_frame_schema(config.schema)
+        self.field = field
+        self.offset = offset
+        self.pulses = pulses or _source_params(config)["pulses"]
+        self.transforms = self.schema.transforms if transforms else ()
+
+    def output_spec(self, shape, dtype):
+        samples = dtype[self.field].shape[-1]
+        return (shape[0] // self.pulses, self.pulses, samples), complex_dtype()
+
+    def process(self, records):
+        apply_transforms(records, self.transforms)
+        values = records[self.field]
+        samples = np.empty(values.shape, dtype=complex_dtype())
+        np.subtract(values, self.offset, out=samples.real, dtype=samples.real.dtype)
+        samples.imag = 0.0
+        return samples.reshape(-1, self.pulses, values.shape[-1])
+
+
+class PulseCompress:
+    """チャープの参照信号で整合フィルタを掛ける（スペクトルは WaveformBank で共有する）"""
+
+    role = "transform"
+
+    def __init__(self, config, N, T, f0, f1, window=None):
+        self.compressor = default_bank.compressor(ChirpParams(N, T, f0, f1), window=window)
+
+    def output_spec(self, shape, dtype):
+        return shape, np.result_type(dtype, complex_dtype())
+
+    def process(self, cube):
+        return self.compressor.compress(cube)
+
+
+class Doppler:
+    """パルス方向のFFTで (CPI, doppler, range) の電力にする"""
+
+    role = "transform"
+
+    def __init__(self, config, window="hann", shift=True):
+        self.window = window
+        self.shift = shift
+        self._processors = {}
+
+    def output_spec(self, shape, dtype):
+        return shape, real_dtype()  # RangeDopplerProcessor は精度設定の型で出力する
+
+    def process(self, cube):
+        n_pulses = cube.shape[-2]
+        if n_pulses not in self._processors:
+            self._processors[n_pulses] = RangeDopplerProcessor(n_pulses, window=self.window, shift=self.shift)
+        return self._processors[n_pulses].process(cube, overwrite=True)
+
+
+class Detect:
+    """CFARの設定ファイルのプロファイルで検出し、疎な検出結果にする"""
+
+    role = "transform"
+
+    def __init__(self, config, profile=None, cfar_config=None, cluster_gap=None):
+        self.cfar = create_cfar(load_cfar_config(cfar_config), profile)
+        self.cluster_gap = cluster_gap
+
+    def output_spec(self, shape, dtype):
+        return None  # 検出数はチャンクごとに違う
+
+    def process(self, power):
+        return self.cfar.detect(power, cluster_gap=self.cluster_gap)
+
+
+class WriteDetections:
+    """検出結果を detection_dtype(3) のレコードとして順に書く（CPI番号は通し番号にする）"""
+
+    role = "sink"
+
+    def __init__(self, config):
+        self.file = open(config.output_file, "wb")
+        self.dtype = detection_dtype(3)
+        self.pulses = _source_params(config)["pulses"]
+        self.cpis = 0
+        self.count = 0
+
+    def write(self, detections, n_records):
+        """n_records はこの検出結果のもとになったレコード数"""
+        detections = detections.astype(self.dtype, copy=False)
+        detections["index"][:, 0] += self.cpis
+        self.file.write(detections.tobytes())
+        self.cpis += n_records // self.pulses
+        self.count += len(detections)
+
+    def close(self):
+        self.file.close()
+
+
+def _source_params(config):
+    return config.stages[0].params
+
+
+STAGE_TYPES = {
+    "read_records": ReadRecords,
+    "decode": Decode,
+    "pulse_compress": PulseCompress,
+    "doppler": Doppler,
+    "cfar": Detect,
+    "write_detections": WriteDetections,
+}
+
+
+def create_stage(config, stage):
+    return STAGE_TYPES[stage.type](config, **stage.params)
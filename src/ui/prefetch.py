@@ -0,0 +1,125 @@
+"""断面のキャッシュと、裏での先読み
+
+スライダーで見ている断面の先（動かしている向き）を別スレッドで読んでおき、合計バイト数が
+max_bytes を超えたら古く使われたものから捨てる (LRU)。表示のスレッドはキャッシュに
+そろった配列だけを使い、ディスクを待たない。
+キャッシュの配列は書き込み禁止なので、コピーせずにスレッド間で受け渡せる。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SliceCache:
+    """(軸, 位置, レベル) -> 配列のタプル の LRU キャッシュ"""
+
+    def __init__(self, max_bytes=512 * 1024**2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, count=True):
+        """キャッシュにあれば配列を返す（count=False ならヒット率に数えない）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            if count:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return None if entry is None else entry[0]
+
+    def put(self, key, arrays):
+        unique = {id(array): array for array in arrays}.values()  # 同じ配列は1回だけ数える
+        for array in unique:
+            array.flags.writeable = False
+        nbytes = sum(array.nbytes for array in unique)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (arrays, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+class SlicePrefetcher:
+    """load(軸, 位置, レベル) を別スレッドで呼んで、結果を cache に入れる
+
+    request() で渡した順に読む。新しい request() は読み終えていない古い要求を置き換えるので、
+    スライダーを速く動かしても今の位置から遠いものは読まない。
+    """
+
+    def __init__(self, load, cache):
+        self.load = load
+        self.cache = cache
+        self.fetches = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._queue = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, keys):
+        with self._condition:
+            self._queue = list(keys)
+            self._condition.notify()
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.fetches if self.fetches else 0.0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return
+                key = self._queue.pop(0)
+            if key in self.cache:
+                continue
+            start = time.perf_counter()
+            try:
+                arrays = self.load(*key)
+            except (IndexError, ValueError) as error:  # データを閉じた直後など
+                print(f"断面 {key} を読めませんでした: {error}")
+                continue
+            latency = time.perf_counter() - start
+            self.cache.put(key, tuple(np.asarray(array) for array in arrays))
+            self.fetches += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def stop(self):
+        """読み込み中の1件が終わるのを待って止める"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
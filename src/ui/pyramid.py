@@ -0,0 +1,208 @@
+"""断面表示用の多重解像度ピラミッドと、表示範囲に合わせた間引き
+
+間引きはブロックごとの最小値と最大値を残し、表示するときは画素ごとに画像の中心値から
+遠い方を選ぶので、細い目標（ピーク）も粗いレベルで消えない。
+
+time 方向の断面 (pos, range) は画面より大きいので、レベルごとに range（と pos）を
+LEVEL_FACTOR 分の1にした (time, 2, rows, cols) の最小値・最大値をデータの隣の
+.pyramid/ に保存し、次からは作らずに使う。pos・range 方向の断面は全解像度の断面を
+その場で間引く。
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+LEVEL_FACTOR = 4
+MIN_LENGTH = 256  # これより短くなる軸はそれ以上まとめない
+
+
+def level_factors(shape):
+    """ピラミッドの各レベル（全解像度を除く）の、軸ごとのまとめる数"""
+    factors = [(1,) * len(shape)]
+    while True:
+        last = factors[-1]
+        factor = tuple(
+            f * LEVEL_FACTOR if -(-n // (f * LEVEL_FACTOR)) >= MIN_LENGTH else f
+            for f, n in zip(last, shape)
+        )
+        if factor == last:
+            return factors[1:]
+        factors.append(factor)
+
+
+def reduce_minmax(low, high, factors):
+    """(最小値, 最大値) の画像を、先頭から factors 個ずつのブロックにまとめる"""
+    for axis, factor in enumerate(factors):
+        if factor > 1:
+            starts = np.arange(0, low.shape[axis], factor)
+            low = np.minimum.reduceat(low, starts, axis=axis)
+            high = np.maximum.reduceat(high, starts, axis=axis)
+    return low, high
+
+
+def pick_extremes(low, high):
+    """画素ごとに、最小値と最大値のうち画像の中心値から遠い方を選ぶ"""
+    if low is high:
+        return low
+    center = (float(low.min()) + float(high.max())) / 2
+    return np.where(high - center >= center - low, high, low)
+
+
+class SlicePyramid:
+    """time 方向の断面の多重解像度ピラミッド（キャッシュは cache_dir に保存する）"""
+
+    def __init__(self, volume, cache_dir=None):
+        self.volume = volume
+        self.factors = level_factors(volume.shape[1:])
+        if cache_dir is None and volume.paths:
+            cache_dir = Path(volume.paths[0]).parent / ".pyramid"
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.levels = []
+        self._cancel = threading.Event()
+
+    @property
+    def key(self):
+        """データと設定が同じときだけ一致するキャッシュの名前"""
+        sources = [(Path(p).name, os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in self.volume.paths]
+        description = (self.volume.shape, self.volume.dtype.str, self.volume.transforms, sources, self.factors)
+        return hashlib.sha1(repr(description).encode()).hexdigest()[:16]
+
+    def level_paths(self):
+        key = self.key
+        return [self.cache_dir / f"{key}_{level}.npy" for level in range(1, len(self.factors) + 1)]
+
+    def load(self):
+        """保存済みのピラミッドがあれば開いて True を返す"""
+        if self.cache_dir is None or not self.factors:
+            return False
+        paths = self.level_paths()
+        if not all(path.is_file() for path in paths):
+            return False
+        self.levels = [np.load(path, mmap_mode="r") for path in paths]
+        return True
+
+    def build(self):
+        """ピラミッドを作って保存する（別スレッドから呼んでよい。cancel() で止まる）
+
+        全フレームを書き終えたときだけ保存して levels を公開し、止めたり失敗したりしたときは
+        書きかけのファイルを消す。
+        """
+        if self.load() or self.cache_dir is None or not self.factors:
+            return
+        self.cache_dir.mkdir(exist_ok=True)
+        paths = self.level_paths()
+        n_time = self.volume.shape[0]
+        shapes = [tuple(-(-n // f) for n, f in zip(self.volume.shape[1:], factor)) for factor in self.factors]
+        # 途中で止まっても不完全なファイルを使わないよう、作り終えてから名前を変える
+        temporary = [path.with_suffix(".tmp") for path in paths]
+        outputs = [
+            np.lib.format.open_memmap(path, mode="w+", dtype=self.volume.dtype, shape=(n_time, 2) + shape)
+            for path, shape in zip(temporary, shapes)
+        ]
+        completed = False
+        try:
+            for t in range(n_time):
+                if self.cancelled:
+                    return
+                low = high = self.volume.slice(0, t)
+                previous = (1, 1)
+                for level, factor in enumerate(self.factors):
+                    low, high = reduce_minmax(low, high, [f // p for f, p in zip(factor, previous)])
+                    outputs[level][t, 0] = low
+                    outputs[level][t, 1] = high
+                    previous = factor
+            for level in range(len(outputs)):
+                outputs[level].flush()
+            completed = not self.cancelled
+        finally:
+            # Windows ではマップを閉じないと名前を変えたり消したりできないので、
+            # outputs の外にメモリマップへの参照（ループ変数など）を残さない
+            del outputs
+            if not completed:
+                for path in temporary:
+                    path.unlink(missing_ok=True)
+        if not completed:
+            return
+        for source, destination in zip(temporary, paths):
+            os.replace(source, destination)
+        self.load()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """build() を次のフレームの前で止める（呼び出し側はスレッドの終了を待ってからデータを閉じる）"""
+        self._cancel.set()
+
+
+class SliceDecimator:
+    """表示範囲と画面の画素数に合わせて断面を間引く
+
+    level() で使うレベルを決め、load() で断面全体をそのレベルで読み（ディスクを読むので
+    表示のスレッドの外で呼んでよい）、render() で表示範囲を切り出して間引く。
+    """
+
+    def __init__(self, volume, pyramid=None):
+        self.volume = volume
+        self.pyramid = pyramid
+
+    @staticmethod
+    def _need(rows, cols, size):
+        # 画面の画素数より多くならないよう切り上げる（画素より細かいと描画時の縮小でピークが消える）
+        span = (rows[1] - rows[0], cols[1] - cols[0])
+        return tuple(max(1, -(-n // max(pixels, 1))) for n, pixels in zip(span, size))
+
+    def factor(self, level):
+        return self.pyramid.factors[level - 1] if level else (1, 1)
+
+    def level(self, axis, rows, cols, size):
+        """全解像度の範囲 rows, cols = [start, stop) を size = (高さ, 幅) 画素に出すときのレベル
+
+        画面より粗くならない範囲で最も粗いレベルを選ぶ（0 は全解像度）。
+        """
+        need = self._need(rows, cols, size)
+        level = 0
+        if axis == 0 and self.pyramid is not None:
+            for i, factor in enumerate(self.pyramid.factors[: len(self.pyramid.levels)], 1):
+                if factor[0] <= need[0] and factor[1] <= need[1]:
+                    level = i
+        return level
+
+    def nbytes(self, axis, level):
+        """load() が返す配列の合計バイト数"""
+        shape = self.volume.slice_shape(axis)
+        n = np.prod([-(-n // f) for n, f in zip(shape, self.factor(level))], dtype=np.int64)
+        return int(n) * self.volume.dtype.itemsize * (2 if level else 1)
+
+    def load(self, axis, index, level):
+        """断面全体を level で (最小値, 最大値) として読む（全解像度では同じ配列）"""
+        if level == 0:
+            image = self.volume.slice(axis, index)
+            return image, image
+        data = self.pyramid.levels[level - 1]
+        return np.array(data[index, 0]), np.array(data[index, 1])
+
+    def render(self, arrays, level, rows, cols, size):
+        """load() の結果から表示範囲を切り出し、画面の画素数程度に間引く
+
+        戻り値は (画像, imshow の extent)。extent は全解像度の座標なので、ズームしても
+        軸の目盛りは変わらない。
+        """
+        need = self._need(rows, cols, size)
+        base = self.factor(level)
+        r0, c0 = rows[0] // base[0], cols[0] // base[1]
+        r1, c1 = -(-rows[1] // base[0]), -(-cols[1] // base[1])
+        low, high = arrays
+        same = low is high
+        low = low[r0:r1, c0:c1]
+        high = low if same else high[r0:r1, c0:c1]
+        rest = (max(1, need[0] // base[0]), max(1, need[1] // base[1]))
+        low, high = reduce_minmax(low, high, rest)
+        block = (base[0] * rest[0], base[1] * rest[1])
+        top, left = r0 * base[0], c0 * base[1]
+        bottom, right = top + low.shape[0] * block[0], left + low.shape[1] * block[1]
+        return pick_extremes(low, high), (left - 0.5, right - 0.5, bottom - 0.5, top - 0.5)
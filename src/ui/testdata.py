@@ -1,8 +1,20 @@
+import sys
+from pathlib import Path
+
 import numpy as np
 
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.precision import real_dtype
+
 
-def create_test_data():
-    np_array = np.zeros([100, 500, 5000])
+def create_test_data(dtype=None):
+    """dtype を省略すると精度設定の実数型（既定 float32 で約1GB）"""
+    np_array = np.zeros([100, 500, 5000], dtype=dtype or real_dtype())
     return np_array
 
 
@@ -1,12 +1,17 @@
+import math
 import os
+import threading
 
+import numpy as np
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
-from testdata import create_test_data
+from prefetch import SliceCache, SlicePrefetcher
+from pyramid import SliceDecimator, SlicePyramid
+from volume import open_volume
 
 
 class ButtonComponent(tk.Button):
@@ -28,34 +33,134 @@ class EntryComponent(tk.Entry):
 class SliderComponent(tk.Scale):
     """スライドバーの設定を個別管理するためのクラス"""
 
-    def __init__(self, master, xpos, ypos, min_value, max_value):
-        super().__init__(master, orient="horizontal", from_=min_value, to=max_value)
+    def __init__(self, master, xpos, ypos, min_value, max_value, command=None):
+        super().__init__(
+            master, orient="horizontal", from_=min_value, to=max_value, command=command
+        )
         self.place(x=xpos, y=ypos)
 
     def get_value(self):
         return self.get()
 
 
+class StatusComponent(tk.Label):
+    """ステータスバーの設定を個別管理するためのクラス"""
+
+    def __init__(self, master, xpos, ypos, width, height):
+        super().__init__(master, anchor="w", relief="sunken")
+        self.place(x=xpos, y=ypos, width=width, height=height)
+
+    def set_text(self, text):
+        self.configure(text=text)
+
+
 class MatplotComponent:
-    """読み込んだ3次元データをmatplotのfigureに変換するクラス"""
+    """読み込んだ3次元データをmatplotのfigureに変換するクラス
 
-    def __init__(self, vol3d):
+    vol3d は volume.Volume で、表示する断面だけをディスクから読む（None なら空のグラフ）。
+    figure は一度だけ作り、断面の切り替えは AxesImage.set_data() とブリットで描き直す。
+    画像は表示範囲と軸の画素数に合わせて間引いたもので、ズーム・パンのたびに作り直す。
+    断面は読み込み済みの配列を show_slice() に渡して表示する（ここではディスクを読まない）。
+    """
+
+    def __init__(self, vol3d=None, pyramid=None):
         self.vol3d = vol3d
+        self.decimator = SliceDecimator(vol3d, pyramid) if vol3d is not None else None
+        self.indices = [0, 0, 0]
+        self.images = []
+        self.backgrounds = []
 
     def create_figure(self):
         fig = plt.figure()
-        ax1 = fig.add_subplot(2, 2, 1)
-        ax1.imshow(self.vol3d[0, :, :])
-        ax2 = fig.add_subplot(2, 2, 2)
-        ax2.imshow(self.vol3d[:, 0, :])
-        ax3 = fig.add_subplot(2, 2, 3)
-        ax3.imshow(self.vol3d[:, :, 0])
+        for axis in range(3):
+            ax = fig.add_subplot(2, 2, axis + 1)
+            if self.vol3d is not None:
+                n_rows, n_cols = self.vol3d.slice_shape(axis)
+                # 断面が読めるまでは空の画像を置いておく
+                # animated にした画像は通常の描画から外れ、ブリットでだけ描かれる
+                self.images.append(
+                    ax.imshow(
+                        np.zeros((1, 1), dtype=self.vol3d.dtype),
+                        extent=(-0.5, n_cols - 0.5, n_rows - 0.5, -0.5),
+                        animated=True,
+                    )
+                )
+                # 間引いた画像の extent で表示範囲が動かないよう、全解像度の範囲に固定する
+                ax.set_autoscale_on(False)
+                ax.set_xlim(-0.5, n_cols - 0.5)
+                ax.set_ylim(n_rows - 0.5, -0.5)
         return fig
 
+    @staticmethod
+    def pixels(ax):
+        return int(ax.bbox.height), int(ax.bbox.width)
+
+    def connect(self, canvas, on_view_changed=None):
+        """canvas が描き直されるたびに、画像を除いた背景を取っておく
+
+        on_view_changed(axis) はズーム・パン・リサイズで間引き直しが必要になったときに呼ばれる。
+        """
+        self.canvas = canvas
+        canvas.mpl_connect("draw_event", self.on_draw)
+        if on_view_changed is None:
+            return
+        for axis, image in enumerate(self.images):
+            for event in ("xlim_changed", "ylim_changed"):
+                image.axes.callbacks.connect(event, lambda ax, axis=axis: on_view_changed(axis))
+        canvas.mpl_connect(
+            "resize_event", lambda event: [on_view_changed(axis) for axis in range(len(self.images))]
+        )
+
+    def view(self, axis):
+        """表示中の範囲を全解像度の [start, stop) の (行, 列) で返す"""
+        ax = self.images[axis].axes
+        ranges = []
+        for limits, n in zip((ax.get_ylim(), ax.get_xlim()), self.vol3d.slice_shape(axis)):
+            start = min(max(0, math.floor(min(limits) + 0.5)), n - 1)
+            stop = max(min(n, math.ceil(max(limits) + 0.5)), start + 1)
+            ranges.append((start, stop))
+        return ranges
+
+    def on_draw(self, event):
+        self.backgrounds = [self.canvas.copy_from_bbox(image.axes.bbox) for image in self.images]
+        for image in self.images:
+            image.axes.draw_artist(image)
+
+    def wanted(self, axis, index):
+        """今の表示範囲で axis 方向の index 番目を出すのに読む断面 (軸, 位置, レベル)"""
+        rows, cols = self.view(axis)
+        return axis, index, self.decimator.level(axis, rows, cols, self.pixels(self.images[axis].axes))
+
+    def show_slice(self, axis, index, level, arrays):
+        """読み込み済みの断面 arrays (SliceDecimator.load() の結果) に差し替え、その軸だけを描き直す"""
+        if not self.images:
+            return
+        self.indices[axis] = index
+        image = self.images[axis]
+        rows, cols = self.view(axis)
+        data, extent = self.decimator.render(arrays, level, rows, cols, self.pixels(image.axes))
+        image.set_data(data)
+        image.set_extent(extent)
+        image.autoscale()
+        if not self.backgrounds:
+            self.canvas.draw_idle()  # まだ一度も描かれていない
+            return
+        self.canvas.restore_region(self.backgrounds[axis])
+        image.axes.draw_artist(image)
+        self.canvas.blit(image.axes.bbox)
+
 
 class MainApp(tk.Frame):
     """GUIのメインクラス"""
 
+    # スライダーのイベントをまとめて処理する間隔 [ms]
+    SLIDER_INTERVAL = 30
+    # 先読みの断面ができたかを確かめる間隔 [ms]
+    POLL_INTERVAL = 15
+    # 動かしている向きに先読みする断面の数
+    PREFETCH_DEPTH = 8
+    CACHE_BYTES = 512 * 1024**2
+
     def __init__(self, master=None):
         super().__init__(master)
         master.geometry("1600x900")
@@ -76,23 +181,133 @@ class MainApp(tk.Frame):
         ]
 
         self.stringvar = tk.StringVar()
+        self.volume = None
+        self.pyramid = None
+        self.pyramid_thread = None
+        self.fig_canvas = None
+        self.pending_slices = {}  # 軸 -> まだ描いていない最新の位置
+        self.slider_job = None
+        self.cache = SliceCache(self.CACHE_BYTES)
+        self.prefetcher = None
+        self.positions = [0, 0, 0]  # 軸ごとに最後に要求した位置
+        self.directions = [1, 1, 1]  # 軸ごとのスライダーを動かしている向き
+        self.waiting = {}  # 軸 -> 読み込みを待っている断面
+        self.plans = {}  # 軸 -> 先読みする断面
+        self.poll_job = None
         self.entry1 = EntryComponent(self.master, self.stringvar, 100, 20, 450, 20)
 
         self.create_graph()
 
         self.image_slider = [
-            SliderComponent(self.master, 1000, 620, 0, 100),  # time
-            SliderComponent(self.master, 1000, 670, 0, 500),  # pos
-            SliderComponent(self.master, 1000, 720, 0, 5000),  # range
+            SliderComponent(self.master, 1000, 620, 0, 100, self.slider_command(0)),  # time
+            SliderComponent(self.master, 1000, 670, 0, 500, self.slider_command(1)),  # pos
+            SliderComponent(self.master, 1000, 720, 0, 5000, self.slider_command(2)),  # range
         ]
+        self.status = StatusComponent(self.master, 10, 870, 1200, 20)
 
     def create_graph(self):
-        self.fig_canvas = FigureCanvasTkAgg(
-            MatplotComponent(create_test_data()).create_figure()
-        )
+        if self.fig_canvas is not None:
+            plt.close(self.fig_canvas.figure)
+            self.fig_canvas.get_tk_widget().destroy()
+            self.toolbar.destroy()
+        self.graph = MatplotComponent(self.volume, self.pyramid)
+        self.fig_canvas = FigureCanvasTkAgg(self.graph.create_figure(), master=self.master)
+        self.graph.connect(self.fig_canvas, self.on_view_changed)
         self.toolbar = NavigationToolbar2Tk(self.fig_canvas, self.master)
         self.fig_canvas.get_tk_widget().place(x=10, y=100, width=1200, height=700)
 
+    def slider_command(self, axis):
+        return lambda value: self.on_slider(axis, int(value))
+
+    def on_slider(self, axis, index):
+        """スライダーを速く動かしても、SLIDER_INTERVAL ごとに最新の位置だけを描く"""
+        self.pending_slices[axis] = index
+        if self.slider_job is None:
+            self.slider_job = self.after(self.SLIDER_INTERVAL, self.flush_slices)
+
+    def on_view_changed(self, axis):
+        """ズーム・パンしたら、今の位置の断面を間引き直す（スライダーと同じようにまとめる）"""
+        self.on_slider(axis, self.positions[axis])
+
+    def flush_slices(self):
+        self.slider_job = None
+        pending, self.pending_slices = self.pending_slices, {}
+        if self.volume is None:
+            return
+        for axis, index in pending.items():
+            self.request_slice(axis, min(index, self.volume.shape[axis] - 1))
+
+    def request_slice(self, axis, index):
+        """キャッシュにあればすぐ描き、なければ先読みのスレッドに頼んでできるのを待つ"""
+        if index != self.positions[axis]:
+            self.directions[axis] = 1 if index > self.positions[axis] else -1
+        self.positions[axis] = index
+        key = self.graph.wanted(axis, index)
+        arrays = self.cache.get(key)
+        if arrays is None:
+            self.waiting[axis] = key
+        else:
+            self.waiting.pop(axis, None)
+            self.graph.show_slice(*key, arrays)
+
+        # 今の位置の先を動かしている向きに、1つだけ後ろも読んでおく
+        # （先読みで表示中のものを追い出さないよう、キャッシュの半分に収まる数まで）
+        step = self.directions[axis]
+        budget = self.cache.max_bytes // 2 // self.graph.decimator.nbytes(axis, key[2])
+        depth = max(1, min(self.PREFETCH_DEPTH, budget - 2))
+        around = [index + step * k for k in range(1, depth + 1)] + [index - step]
+        self.plans[axis] = [(axis, i, key[2]) for i in around if 0 <= i < self.volume.shape[axis]]
+        # 待っている断面を先に、次に今動かした軸の先読みを読む
+        order = [axis] + [other for other in self.plans if other != axis]
+        self.prefetcher.request(
+            list(self.waiting.values()) + [planned for other in order for planned in self.plans[other]]
+        )
+        self.update_status()
+        if self.waiting and self.poll_job is None:
+            self.poll_job = self.after(self.POLL_INTERVAL, self.poll_slices)
+
+    def poll_slices(self):
+        """先読みのスレッドが読み終えた断面を描く（Tk のスレッドで動く）"""
+        self.poll_job = None
+        for axis, key in list(self.waiting.items()):
+            arrays = self.cache.get(key, count=False)
+            if arrays is not None:
+                del self.waiting[axis]
+                self.graph.show_slice(*key, arrays)
+        self.update_status()
+        if self.waiting:
+            self.poll_job = self.after(self.POLL_INTERVAL, self.poll_slices)
+
+    def update_status(self):
+        cache = self.cache
+        text = (
+            f"キャッシュ {len(cache)} 件 {cache.nbytes / 1e6:.0f} / {cache.max_bytes / 1e6:.0f} MB"
+            f"  ヒット率 {cache.hit_rate:.0%} ({cache.hits} / {cache.hits + cache.misses})"
+        )
+        if self.prefetcher is not None and self.prefetcher.fetches:
+            text += (
+                f"  読み込み 平均 {self.prefetcher.mean_latency * 1e3:.1f} ms"
+                f" / 最大 {self.prefetcher.max_latency * 1e3:.1f} ms"
+            )
+        if self.waiting:
+            text += "  読み込み中..."
+        self.status.set_text(text)
+
+    @staticmethod
+    def build_pyramid(pyramid):
+        try:
+            pyramid.build()
+        except (OSError, IndexError, ValueError) as error:  # 書き込めない・読めないときは、その場の間引きだけで表示する
+            print(f"ピラミッドを作れませんでした: {error}")
+
+    def wait_pyramid(self, pyramid):
+        if pyramid is not self.pyramid or pyramid.cancelled:
+            return
+        if pyramid.levels:
+            self.on_view_changed(0)
+        else:
+            self.after(500, self.wait_pyramid, pyramid)
+
     def select_folder(self):
         init_dir = os.path.abspath(os.path.dirname(__file__))
         folder_path = filedialog.askdirectory(initialdir=init_dir)
@@ -100,10 +315,39 @@ class MainApp(tk.Frame):
             self.stringvar.set(folder_path)
 
     def display_data(self):
-        if self.stringvar.get():
-            print("OK")
-        else:  # todo:ここのエラーチェックをもう少しまともに エラーチェックとか
+        if not self.stringvar.get():
             messagebox.showinfo("error", "Pathが選択されていません。")
+            return
+        try:
+            # メモリマップで開くだけなので、大きなデータでもすぐに終わる
+            volume = open_volume(self.stringvar.get())
+        except (OSError, ValueError) as error:
+            messagebox.showerror("error", f"データを開けませんでした。\n{error}")
+            return
+        if self.volume is not None:
+            # 裏のスレッドが断面を読み終えてから閉じる
+            self.pyramid.cancel()
+            if self.pyramid_thread is not None:
+                self.pyramid_thread.join()
+            self.prefetcher.stop()
+            self.volume.close()
+        self.cache.clear()
+        self.pending_slices, self.waiting, self.plans = {}, {}, {}
+        self.positions, self.directions = [0, 0, 0], [1, 1, 1]
+        self.volume = volume
+        self.pyramid = SlicePyramid(volume)
+        self.pyramid_thread = None
+        if not self.pyramid.load():
+            # 初回だけ裏で作る。できるまではその場の間引きで表示する
+            self.pyramid_thread = threading.Thread(target=self.build_pyramid, args=(self.pyramid,), daemon=True)
+            self.pyramid_thread.start()
+            self.after(500, self.wait_pyramid, self.pyramid)
+        self.create_graph()
+        self.prefetcher = SlicePrefetcher(self.graph.decimator.load, self.cache)
+        for axis, (slider, n) in enumerate(zip(self.image_slider, volume.shape)):
+            slider.configure(to=n - 1)
+            slider.set(0)
+            self.on_slider(axis, 0)
 
 
 def main():
@@ -3,6 +3,16 @@ from tkinter import ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
+import sys
+from pathlib import Path
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.decimated_plot import DecimatedLine
 
 
 class EventHandler:
@@ -93,6 +103,7 @@ class ClassC(tk.Frame):
         self.figure, self.axes = plt.subplots(3, 1, figsize=(5, 6))
         self.canvas = FigureCanvasTkAgg(self.figure, self)
         self.canvas.get_tk_widget().pack()
+        self.lines = [None, None, None]  # 最初に色を変えたときに作り、以降は色だけ変える
 
         # イベントを購読
         self.event_handler.subscribe("color_changed", self.update_color)
@@ -107,15 +118,15 @@ class ClassC(tk.Frame):
             self.line_colors[graph_index][2] = value
 
         # 対象のグラフのみ再描画
-        x = np.linspace(0, 10, 100)
-        y_list = [np.sin(x), np.cos(x), np.tan(x)]
-
-        self.axes[graph_index].clear()
-        self.axes[graph_index].plot(
-            x, y_list[graph_index], color=self._get_color(graph_index)
-        )
-        self.axes[graph_index].set_title(f"Graph {graph_index+1}")
-        self.canvas.draw()
+        if self.lines[graph_index] is None:
+            x = np.linspace(0, 10, 100)
+            y_list = [np.sin(x), np.cos(x), np.tan(x)]
+            self.lines[graph_index] = DecimatedLine(
+                self.axes[graph_index], x, y_list[graph_index]
+            )
+            self.axes[graph_index].set_title(f"Graph {graph_index+1}")
+        self.lines[graph_index].set_color(self._get_color(graph_index))
+        self.canvas.draw_idle()
 
     def _get_color(self, graph_index):
         """現在のRGB値を正規化してMatplotlib用の色に変換"""
@@ -2,6 +2,16 @@ import tkinter as tk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
+import sys
+from pathlib import Path
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.decimated_plot import DecimatedLine
 
 
 class EventHandler:
@@ -59,30 +69,23 @@ class GraphController(tk.Frame):
         self.draw_graphs()
 
     def draw_graphs(self):
-        """すべてのグラフを描画"""
+        """すべてのグラフを描画（折れ線は作ったものを使い続け、表示範囲に合わせて間引く）"""
         x = np.linspace(0, 10, 100)
         y_list = [np.sin(x), np.cos(x), np.tan(x)]
 
+        self.lines = []
         for i, ax in enumerate(self.axes):
-            ax.clear()
-            ax.plot(x, y_list[i], color=self.graph_models[i].get_color())
+            self.lines.append(
+                DecimatedLine(ax, x, y_list[i], color=self.graph_models[i].get_color())
+            )
             ax.set_title(f"Graph {i+1}")
 
         self.canvas.draw()
 
     def update_graph(self, graph_index):
-        """指定されたグラフのみ更新"""
-        x = np.linspace(0, 10, 100)
-        y_list = [np.sin(x), np.cos(x), np.tan(x)]
-
-        ax = self.axes[graph_index]
-        ax.clear()
-        ax.plot(
-            x, y_list[graph_index], color=self.graph_models[graph_index].get_color()
-        )
-        ax.set_title(f"Graph {graph_index+1}")
-
-        self.canvas.draw()
+        """指定されたグラフのみ更新（色だけを変える）"""
+        self.lines[graph_index].set_color(self.graph_models[graph_index].get_color())
+        self.canvas.draw_idle()
 
 
 class ColorControl(tk.Frame):
@@ -0,0 +1,143 @@
+"""フォルダ内の収録データを (time, pos, range) の3次元ボリュームとして遅延読み込みする
+
+ファイルはメモリマップするだけで開いた時点では読まず、slice() で要求された断面だけを
+ディスクから読む（ページキャッシュに載るのも表示した断面の分だけ）。
+
+対応する形式:
+    *.npy  2次元 (pos, range) または3次元 (time, pos, range) の配列
+    *.bin  フレーム定義 (setting/frame.yaml) のレコード列。pulses レコードを1CPIとして
+           (CPI, pulses, samples) に並べる（pulses の既定は setting/pipeline.yaml の read 段）
+フォルダ内の同じ形式のファイルは名前順に time 方向につなぐ。
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 現在のファイル位置から3階層上のディレクトリを取得
+project_root = Path(__file__).resolve().parent.parent.parent
+
+# sys.path にプロジェクトのルートディレクトリを追加
+sys.path.append(str(project_root))
+
+from common.frame import TRANSFORMS, load_frame_schema, open_records
+from common.load_yaml import load_yaml
+from common.precision import real_dtype
+
+DEFAULT_PIPELINE_PATH = project_root / "setting" / "pipeline.yaml"
+
+
+class Volume:
+    """複数の3次元配列（メモリマップ）を先頭軸方向につないだ読み取り専用ボリューム
+
+    transforms はフレーム定義の変換のうち field に掛かるもので、断面を読んだあとに適用する。
+    paths は元のファイル（間引き用のキャッシュの置き場所と、更新の確認に使う）。
+    """
+
+    def __init__(self, parts, transforms=(), name="", paths=()):
+        parts = [part[np.newaxis] if part.ndim == 2 else part for part in parts]
+        if not parts:
+            raise ValueError("データがありません。")
+        for part in parts:
+            if part.ndim != 3 or part.shape[1:] != parts[0].shape[1:]:
+                raise ValueError(f"ファイルごとの形がそろっていません: {[p.shape for p in parts]}")
+        self.parts = parts
+        self.transforms = tuple(transforms)
+        self.name = name
+        self.paths = tuple(paths)
+        # time 方向の各ファイルの開始位置
+        self.starts = np.cumsum([0] + [len(part) for part in parts])
+        self.shape = (int(self.starts[-1]),) + parts[0].shape[1:]
+        self.dtype = real_dtype()
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape, dtype=np.int64)) * self.dtype.itemsize
+
+    def slice_shape(self, axis):
+        return tuple(n for i, n in enumerate(self.shape) if i != axis)
+
+    def slice(self, axis, index, out=None):
+        """axis 方向の index 番目の断面（2次元）を精度設定の実数型で返す"""
+        if not 0 <= index < self.shape[axis]:
+            raise IndexError(f"{index} は軸 {axis} の範囲 0～{self.shape[axis] - 1} の外です。")
+        if out is None:
+            out = np.empty(self.slice_shape(axis), dtype=self.dtype)
+        if axis == 0:
+            part = np.searchsorted(self.starts, index, side="right") - 1
+            self._copy(self.parts[part][index - self.starts[part]], out)
+        else:
+            for part, start, stop in zip(self.parts, self.starts[:-1], self.starts[1:]):
+                self._copy(part[:, index] if axis == 1 else part[:, :, index], out[start:stop])
+        return out
+
+    def _copy(self, source, out):
+        """ディスクから読んだ断面に変換を掛けて out に書く"""
+        if self.transforms:
+            source = np.array(source)
+            for transform in self.transforms:
+                TRANSFORMS[transform.type](source, **transform.params)
+        np.copyto(out, source, casting="unsafe")
+
+    def close(self):
+        """メモリマップを手放す（以降の slice() は使えない）"""
+        self.parts = []
+
+
+def _pipeline_defaults(yaml_file_path=DEFAULT_PIPELINE_PATH):
+    """(フレーム定義のパス, 1CPIのレコード数) を処理パイプラインの設定から取る"""
+    pipeline = (load_yaml(yaml_file_path) or {}).get("pipeline", {})
+    stages = pipeline.get("stages") or [{}]
+    schema = pipeline.get("schema", "setting/frame.yaml")
+    return project_root / schema, (stages[0].get("params") or {}).get("pulses", 1)
+
+
+def _open_npy(paths, **options):
+    return [np.load(path, mmap_mode="r") for path in paths], ()
+
+
+def _open_bin(paths, schema_path=None, pulses=None, field="data"):
+    default_schema, default_pulses = _pipeline_defaults()
+    schema = load_frame_schema(schema_path or default_schema)
+    pulses = pulses or default_pulses
+    if field not in schema.dtype.names:
+        raise ValueError(f"フレーム定義に {field} がありません: {schema.dtype.names}")
+    parts = []
+    for path in paths:
+        records = open_records(path, schema.dtype)
+        values = records[field][: len(records) - len(records) % pulses]
+        # 構造化配列のフィールドはレコード長おきのビューなので、reshape してもコピーされない
+        parts.append(values.reshape(-1, pulses, values.shape[-1]))
+    return parts, tuple(t for t in schema.transforms if t.field == field)
+
+
+OPENERS = {".npy": _open_npy, ".bin": _open_bin}
+
+
+def open_volume(folder, **options):
+    """フォルダ（またはファイル1つ）の収録データを Volume として開く
+
+    options は .bin 用の schema_path, pulses, field（.npy では使わない）。
+    """
+    folder = Path(folder)
+    paths = [folder] if folder.is_file() else sorted(p for p in folder.iterdir() if p.is_file())
+    for suffix, opener in OPENERS.items():
+        matched = [path for path in paths if path.suffix == suffix]
+        if matched:
+            parts, transforms = opener(matched, **options)
+            return Volume(parts, transforms, name=str(folder), paths=matched)
+    raise ValueError(f"{folder} に読み込めるデータ ({', '.join(OPENERS)}) がありません。")
+
+
+# test
+if __name__ == "__main__":
+    import time
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else "data"
+    start = time.perf_counter()
+    volume = open_volume(folder)
+    print(f"{volume.name}: {volume.shape}, {volume.nbytes / 1e9:.2f} GB, 開くのに {time.perf_counter() - start:.3f} s")
+    for axis in range(3):
+        start = time.perf_counter()
+        image = volume.slice(axis, volume.shape[axis] // 2)
+        print(f"軸 {axis} の断面 {image.shape}: {time.perf_counter() - start:.3f} s")